@@ -16,6 +16,8 @@ from tools.store_farmer_profile import store_farmer_profile_to_firestore, update
 from tools.market_trend_advisor import personalized_market_trends
 from tools.mandi_price import get_mandi_prices_with_travel
 from tools.weather_tool import get_7_day_forecast
+from tools.scheme_advisor import SCHEME_WARMUP_ON_STARTUP, shutdown_scheme_loop, warm_up_scheme_resources
+from contextlib import asynccontextmanager
 import uuid
 import json
 import mimetypes
@@ -23,7 +25,14 @@ import base64
 import tempfile
 from google.cloud import firestore
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SCHEME_WARMUP_ON_STARTUP:
+        warm_up_scheme_resources()
+    yield
+    shutdown_scheme_loop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +40,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
 class TTSRequest(BaseModel):
     text: str
     voice: str = "Kore"  
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import shutil
+import threading
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from tools.http_client import http_get
+
+load_dotenv()
+GOV_API = os.getenv("GOV_API")
+AGMARKNET_API_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+AGMARKNET_SNAPSHOT_DIR = os.getenv("AGMARKNET_SNAPSHOT_DIR", os.path.join("data", "agmarknet_snapshot"))
+AGMARKNET_SNAPSHOT_MAX_AGE_HOURS = float(os.getenv("AGMARKNET_SNAPSHOT_MAX_AGE_HOURS", "36"))
+AGMARKNET_PAGE_SIZE = int(os.getenv("AGMARKNET_PAGE_SIZE", "500"))
+AGMARKNET_MAX_CONCURRENT_PAGES = int(os.getenv("AGMARKNET_MAX_CONCURRENT_PAGES", "4"))
+
+# Columns stored dictionary-encoded (int32 codes + category table) and as float64 prices.
+CATEGORICAL_COLUMNS = ["state", "district", "market", "commodity", "variety", "grade", "arrival_date"]
+PRICE_COLUMNS = ["min_price", "max_price", "modal_price"]
+FILTER_COLUMNS = ["state", "district", "market", "commodity", "variety"]
+
+
+def fetch_agmarknet_page(filters, offset=0, limit=100):
+    """
+    Fetches one page of the Agmarknet resource for the given `{column: value}` filters.
+
+    Returns the decoded JSON body, which carries `records` and the overall `total`.
+    Raises `requests.HTTPError` on a non-200 response.
+    """
+    params = {
+        "api-key": GOV_API,
+        "format": "json",
+        "limit": limit,
+        "offset": offset
+    }
+    for column, value in filters.items():
+        if value:
+            params[f"filters[{column}.keyword]"] = value
+
+    response = http_get(AGMARKNET_API_URL, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_agmarknet_records(filters, page_size=AGMARKNET_PAGE_SIZE, max_workers=AGMARKNET_MAX_CONCURRENT_PAGES, first_page=None):
+    """
+    Streams every Agmarknet record matching `filters`.
+
+    The first page (fetched here unless passed in as `first_page`) gives the `total`;
+    the remaining offsets are fetched with at most `max_workers` pages in flight and
+    their records are yielded as each page arrives, so callers never hold the full
+    result set. Pages that fail are reported and skipped.
+    """
+    if first_page is None:
+        first_page = fetch_agmarknet_page(filters, offset=0, limit=page_size)
+    first_records = first_page.get("records", [])
+    yield from first_records
+
+    total = int(first_page.get("total", 0) or 0)
+    if not first_records or len(first_records) >= total:
+        return
+
+    offsets = iter(range(len(first_records), total, page_size))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = {}
+        for offset in offsets:
+            pending[executor.submit(fetch_agmarknet_page, filters, offset, page_size)] = offset
+            if len(pending) >= max_workers:
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset = pending.pop(future)
+                try:
+                    page = future.result().get("records", [])
+                except Exception as e:
+                    print(f"Agmarknet page at offset {offset} failed: {e}")
+                    page = []
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending[executor.submit(fetch_agmarknet_page, filters, next_offset, page_size)] = next_offset
+                yield from page
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _encode_column(values):
+    categories, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return categories, codes.astype(np.int32)
+
+
+def _parse_price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def write_snapshot(records, path=AGMARKNET_SNAPSHOT_DIR):
+    """
+    Writes `records` as a columnar snapshot directory, replacing any previous one atomically.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for column in CATEGORICAL_COLUMNS:
+        categories, codes = _encode_column([rec.get(column) or "" for rec in records])
+        np.save(os.path.join(tmp_path, f"{column}.categories.npy"), categories)
+        np.save(os.path.join(tmp_path, f"{column}.codes.npy"), codes)
+
+    for column in PRICE_COLUMNS:
+        prices = np.array([_parse_price(rec.get(column)) for rec in records], dtype=np.float64)
+        np.save(os.path.join(tmp_path, f"{column}.npy"), prices)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"synced_at": time.time(), "rows": len(records)}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def sync_snapshot(path=AGMARKNET_SNAPSHOT_DIR, page_size=1000, populate_mandi_registry=True):
+    """
+    Pulls the full daily Agmarknet resource by paging through `offset` and stores it
+    as a local columnar snapshot. New mandis are also added to the mandi registry.
+    """
+    records = list(iter_agmarknet_records({}, page_size=page_size))
+    write_snapshot(records, path)
+    if populate_mandi_registry:
+        from tools.mandi_registry import populate_registry
+        populate_registry(records)
+    return len(records)
+
+
+def _format_price(value):
+    # Same strings the API returns: integral prices without a decimal point, others at full precision.
+    if np.isnan(value):
+        return ""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class AgmarknetSnapshot:
+    """
+    In-process query engine over a columnar Agmarknet snapshot.
+
+    Codes and prices are memory-mapped; each filterable column keeps a posting list
+    (rows sorted by code) so an equality filter is a dictionary lookup plus a slice.
+    """
+
+    def __init__(self, path=AGMARKNET_SNAPSHOT_DIR):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        self.categories = {}
+        self.code_lookup = {}
+        self.codes = {}
+        for column in CATEGORICAL_COLUMNS:
+            categories = np.load(os.path.join(path, f"{column}.categories.npy"))
+            self.categories[column] = categories
+            self.code_lookup[column] = {value: code for code, value in enumerate(categories.tolist())}
+            self.codes[column] = np.load(os.path.join(path, f"{column}.codes.npy"), mmap_mode="r")
+
+        self.prices = {
+            column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+            for column in PRICE_COLUMNS
+        }
+
+        self.postings = {}
+        for column in FILTER_COLUMNS:
+            order = np.argsort(self.codes[column], kind="stable")
+            bounds = np.searchsorted(self.codes[column][order], np.arange(len(self.categories[column]) + 1))
+            self.postings[column] = (order, bounds)
+
+    @property
+    def age_hours(self):
+        return (time.time() - self.meta["synced_at"]) / 3600.0
+
+    def query_rows(self, state=None, district=None, market=None, commodity=None, variety=None):
+        filters = {"state": state, "district": district, "market": market, "commodity": commodity, "variety": variety}
+        active = {}
+        for column, value in filters.items():
+            if not value:
+                continue
+            code = self.code_lookup[column].get(value)
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            active[column] = code
+
+        if not active:
+            return np.arange(self.meta["rows"])
+
+        # Start from the shortest posting list and mask the remaining filters.
+        def posting(column):
+            order, bounds = self.postings[column]
+            code = active[column]
+            return order[bounds[code]:bounds[code + 1]]
+
+        lists = {column: posting(column) for column in active}
+        first = min(lists, key=lambda column: len(lists[column]))
+        rows = lists[first]
+        for column, code in active.items():
+            if column != first:
+                rows = rows[self.codes[column][rows] == code]
+        return np.sort(rows)
+
+    def to_records(self, rows):
+        columns = {column: self.categories[column][self.codes[column][rows]].tolist() for column in CATEGORICAL_COLUMNS}
+        prices = {column: [_format_price(v) for v in self.prices[column][rows]] for column in PRICE_COLUMNS}
+        columns.update(prices)
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def iter_records(self, state=None, district=None, market=None, commodity=None, variety=None, chunk_size=AGMARKNET_PAGE_SIZE):
+        rows = self.query_rows(state, district, market, commodity, variety)
+        for start in range(0, len(rows), chunk_size):
+            yield from self.to_records(rows[start:start + chunk_size])
+
+    def query(self, state=None, district=None, market=None, commodity=None, variety=None):
+        """
+        Returns the matching records in the same shape as the Agmarknet API `records`.
+        """
+        return self.to_records(self.query_rows(state, district, market, commodity, variety))
+
+
+_snapshot = None
+_snapshot_mtime = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(path=AGMARKNET_SNAPSHOT_DIR):
+    """
+    Returns the loaded snapshot, reloading it after a sync, or None when no snapshot
+    exists or it is older than `AGMARKNET_SNAPSHOT_MAX_AGE_HOURS`.
+    """
+    global _snapshot, _snapshot_mtime
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+    with _snapshot_lock:
+        if _snapshot is None or mtime != _snapshot_mtime:
+            try:
+                _snapshot = AgmarknetSnapshot(path)
+                _snapshot_mtime = mtime
+            except Exception as e:
+                print("Failed to load Agmarknet snapshot:", e)
+                return None
+        snapshot = _snapshot
+
+    if snapshot.age_hours > AGMARKNET_SNAPSHOT_MAX_AGE_HOURS:
+        return None
+    return snapshot
+
+
+if __name__ == "__main__":
+    count = sync_snapshot()
+    print(f"Agmarknet snapshot written to {AGMARKNET_SNAPSHOT_DIR} ({count} records, {datetime.now().isoformat()})")
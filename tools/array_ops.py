@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def top_k_indices(values, valid, k):
+    """
+    Indices of the `k` smallest `values` among positions where `valid` is true,
+    ordered ascending. Uses `argpartition`, so cost is linear in the input size.
+    """
+    candidates = np.flatnonzero(valid)
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(values[candidates], k - 1)[:k]]
+    return candidates[np.argsort(values[candidates], kind="stable")]
@@ -0,0 +1,134 @@
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from tools.local_cache import LRUCache, SqliteCache, file_lock
+
+load_dotenv()
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("data", "embedding_cache"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model name, SHA-256 of the text).
+
+    An in-process LRU sits in front of a per-model disk tier under `root`: an
+    append-only float32 matrix read through a memory map, plus a SQLite table of
+    digest -> row. `encode` sends only the texts missing from both tiers to the
+    model, in one batch. Several processes may share `root`: appends hold an
+    exclusive file lock and take their rows from the file size, and digests
+    another process added are looked up in SQLite.
+    """
+
+    def __init__(self, model_name, root=EMBEDDING_CACHE_DIR, maxsize=EMBEDDING_CACHE_SIZE):
+        self.model_name = model_name
+        self.directory = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.lock_path = os.path.join(self.directory, "vectors.lock")
+        self.rows = SqliteCache(os.path.join(self.directory, "index.sqlite"), table="rows")
+        self.memory = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._row_of = None
+        self._vectors = None
+        self.dim = None
+        self.disk_hits = 0
+        self.encoded = 0
+
+    def _load(self):
+        if self._row_of is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._row_of = {}
+            for digest, value in self.rows.items():
+                self._row_of[digest] = value["row"]
+                self.dim = value["dim"]
+            self._open()
+
+    def _open(self):
+        count = os.path.getsize(self.vectors_path) // (4 * self.dim) if self.dim and os.path.exists(self.vectors_path) else 0
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim)) if count else None
+
+    def _row(self, digest):
+        """Row of `digest` in the vector file, or None; falls back to SQLite for rows other processes added."""
+        row = self._row_of.get(digest)
+        if row is None:
+            value = self.rows.get(digest)
+            if value is None:
+                return None
+            row = self._row_of[digest] = value["row"]
+            self.dim = self.dim or value["dim"]
+        if self._vectors is None or row >= len(self._vectors):
+            self._open()
+        return row if self._vectors is not None and row < len(self._vectors) else None
+
+    def _append(self, digests, vectors):
+        row_bytes = 4 * self.dim
+        with file_lock(self.lock_path), open(self.vectors_path, "a+b") as f:
+            # Drop a partial row left by a writer that died mid-append.
+            start = os.fstat(f.fileno()).st_size // row_bytes
+            f.truncate(start * row_bytes)
+            f.write(vectors.astype(np.float32).tobytes())
+            f.flush()
+            for i, digest in enumerate(digests):
+                self._row_of[digest] = start + i
+                self.rows.set(digest, {"row": start + i, "dim": self.dim})
+        self._open()
+
+    def encode(self, texts, encode_batch):
+        """
+        (len(texts) x dim) float32 embeddings. `encode_batch(texts)` is called at
+        most once, with the distinct cache misses.
+        """
+        digests = [text_digest(text) for text in texts]
+        found = {}
+        with self._lock:
+            self._load()
+            for digest in digests:
+                if digest in found:
+                    continue
+                vector = self.memory.get(digest)
+                if vector is None:
+                    row = self._row(digest)
+                    if row is not None:
+                        vector = np.array(self._vectors[row])
+                        self.memory.set(digest, vector)
+                        self.disk_hits += 1
+                if vector is not None:
+                    found[digest] = vector
+
+        missing = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found:
+                missing.setdefault(digest, text)
+        if missing:
+            vectors = np.asarray(encode_batch(list(missing.values())), dtype=np.float32)
+            self.encoded += len(missing)
+            with self._lock:
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                new = [(digest, vector) for digest, vector in zip(missing, vectors) if digest not in self._row_of]
+                if new:
+                    self._append([digest for digest, _ in new], np.stack([vector for _, vector in new]))
+                for digest, vector in zip(missing, vectors):
+                    self.memory.set(digest, vector)
+                    found[digest] = vector
+
+        if not digests:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack([found[digest] for digest in digests])
+
+    def stats(self):
+        lookups = self.memory.hits + self.memory.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "encoded": self.encoded,
+            "hit_rate": (self.memory.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import weakref
+import requests
+import aiohttp
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+# Longest wait before a retry; a longer Retry-After ends the retries instead.
+HTTP_MAX_BACKOFF_SECONDS = float(os.getenv("HTTP_MAX_BACKOFF_SECONDS", "30"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods retried by default; others only when the caller passes `idempotent=True`.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Process-wide `requests.Session`. Its adapter keeps one keep-alive connection
+    pool per host (Google APIs, data.gov.in, ISRIC, ...) of up to `HTTP_POOL_SIZE`
+    connections, so repeated calls skip the TCP+TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _backoff_seconds(attempt, retry_after=None):
+    """Seconds to wait before the next attempt, or None when Retry-After asks for more than the maximum."""
+    try:
+        if retry_after is not None:
+            seconds = float(retry_after)
+            return seconds if seconds <= HTTP_MAX_BACKOFF_SECONDS else None
+    except ValueError:
+        pass
+    # Full jitter: uniform in [0, base * 2^attempt], capped.
+    return random.uniform(0, min(HTTP_MAX_BACKOFF_SECONDS, HTTP_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+def _retry_budget(method, retries, idempotent):
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    return retries if idempotent else 0
+
+
+def http_request(method, url, timeout=HTTP_TIMEOUT_SECONDS, retries=HTTP_MAX_RETRIES, idempotent=None, **kwargs):
+    """
+    Sends a request through the shared session, retrying connection errors,
+    timeouts and 429/5xx responses with jittered exponential backoff. Only
+    idempotent methods are retried unless `idempotent=True` is passed. The last
+    response (or exception) is returned (or raised) once retries run out or the
+    server's Retry-After exceeds `HTTP_MAX_BACKOFF_SECONDS`.
+    """
+    retries = _retry_budget(method, retries, idempotent)
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+        delay = _backoff_seconds(attempt, retry_after)
+        if delay is None:
+            return response
+        time.sleep(delay)
+
+
+def http_get(url, **kwargs):
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    return http_request("POST", url, **kwargs)
+
+
+class AsyncResponse:
+    """Fully read response returned by the async face, so no connection is held open."""
+
+    def __init__(self, url, status_code, headers, content, text):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+# aiohttp sessions are bound to the event loop that created them, so keep one per loop.
+_async_sessions = weakref.WeakKeyDictionary()
+# Per-host concurrency limits, shared by every task on a loop.
+_host_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_async_session():
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=HTTP_POOL_SIZE, ttl_dns_cache=300)
+        session = aiohttp.ClientSession(connector=connector)
+        _async_sessions[loop] = session
+    return session
+
+
+def get_host_semaphore(url, limit):
+    """
+    Semaphore bounding concurrent requests from the current loop to `url`'s host.
+    Every caller on the loop shares it, so the limit holds across concurrent
+    pipelines; `limit` only applies when the host's semaphore is first created.
+    """
+    semaphores = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc.lower()
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(limit)
+    return semaphores[host]
+
+
+async def close_async_session():
+    _host_semaphores.pop(asyncio.get_running_loop(), None)
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def async_http_request(method, url, timeout=HTTP_TIMEOUT_SECONDS, retries=HTTP_MAX_RETRIES, idempotent=None, **kwargs):
+    """
+    Async counterpart of `http_request` on the current loop's pooled aiohttp session.
+    """
+    retries = _retry_budget(method, retries, idempotent)
+    session = get_async_session()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with session.request(method, url, timeout=client_timeout, **kwargs) as res:
+                content = await res.read()
+                text = await res.text(errors="replace")
+                response = AsyncResponse(str(res.url), res.status, res.headers, content, text)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+        delay = _backoff_seconds(attempt, retry_after)
+        if delay is None:
+            return response
+        await asyncio.sleep(delay)
+
+
+async def async_http_get(url, **kwargs):
+    return await async_http_request("GET", url, **kwargs)
+
+
+async def async_http_post(url, **kwargs):
+    return await async_http_request("POST", url, **kwargs)
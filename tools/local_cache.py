@@ -0,0 +1,277 @@
+import os
+import time
+import json
+import fcntl
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_MISSING = object()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Advisory lock on `path`, held across processes (and threads) for the block:
+    exclusive for writers, or shared with other readers when `shared=True`.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class LRUCache:
+    """Thread-safe in-process LRU map with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Like `get`, without touching recency or counters."""
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache:
+    """
+    Persistent key -> value table in a local SQLite file. Values are JSON-encoded
+    unless `raw=True`, in which case they are stored as-is (e.g. bytes).
+    """
+
+    def __init__(self, path, table="cache", raw=False):
+        self.path = path
+        self.table = table
+        self.raw = raw
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value BLOB, stored_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_entry(self, key):
+        """Returns `(stored_at, value)` or None."""
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[1], (row[0] if self.raw else json.loads(row[0]))
+
+    def get(self, key, default=None, max_age=None):
+        entry = self.get_entry(key)
+        if entry is None or (max_age is not None and time.time() - entry[0] > max_age):
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        stored = value if self.raw else json.dumps(value)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, stored, time.time()),
+            )
+            conn.commit()
+
+    def items(self, limit=None):
+        """`(key, value)` pairs, most recently stored first."""
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT key, value FROM {self.table} ORDER BY stored_at DESC LIMIT ?",
+                (-1 if limit is None else limit,),
+            ).fetchall()
+        return [(key, value if self.raw else json.loads(value)) for key, value in rows]
+
+    def delete(self, key):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
+
+
+class TieredCache:
+    """
+    In-process LRU in front of a persistent `SqliteCache`. Disk hits are promoted
+    into memory. `max_age=None` means entries never expire.
+    """
+
+    def __init__(self, path, table="cache", maxsize=1024, max_age=None, raw=False):
+        self.memory = LRUCache(maxsize)
+        self.disk = SqliteCache(path, table, raw=raw)
+        self.max_age = max_age
+        self.disk_hits = 0
+
+    def get(self, key, default=None):
+        entry = self.memory.get(key, _MISSING)
+        if entry is not _MISSING:
+            stored_at, value = entry
+            if self.max_age is None or time.time() - stored_at <= self.max_age:
+                return value
+            self.memory.delete(key)
+
+        entry = self.disk.get_entry(key)
+        if entry is None or (self.max_age is not None and time.time() - entry[0] > self.max_age):
+            return default
+        self.disk_hits += 1
+        self.memory.set(key, entry)
+        return entry[1]
+
+    def set(self, key, value):
+        self.memory.set(key, (time.time(), value))
+        self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self):
+        lookups = self.memory.hits + self.memory.misses
+        hits = self.memory.hits + self.disk_hits
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "misses": lookups - hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+class RefreshingCache:
+    """
+    In-process TTL cache with request coalescing and stale-while-revalidate.
+
+    Concurrent misses for one key share a single `loader()` call. Entries older
+    than `ttl` but within `ttl + stale_ttl` are served immediately while one
+    background refresh runs. Values for which `cacheable(value)` is false are
+    returned but not stored. With `timestamped=True`, `loader()` returns
+    `(stored_at, value)` and the entry ages from `stored_at`, so a value read from
+    a persistent tier keeps only its remaining TTL.
+    """
+
+    def __init__(self, ttl, stale_ttl=0, maxsize=4096, cacheable=None, max_refresh_workers=4, timestamped=False):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timestamped = timestamped
+        self.cacheable = cacheable or (lambda value: True)
+        self._entries = LRUCache(maxsize)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=max_refresh_workers)
+        self.stale_hits = 0
+        self.loads = 0
+
+    def _load(self, key, loader, future):
+        try:
+            stored_at, value = loader() if self.timestamped else (time.time(), loader())
+            self.loads += 1
+            if self.cacheable(value):
+                self._entries.set(key, (stored_at, value))
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _claim(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            # Another caller may have finished loading between our miss and this claim.
+            entry = self._entries.peek(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                future.set_result(entry[1])
+                return future, False
+            self._inflight[key] = future
+            return future, True
+
+    def get_or_load(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age <= self.ttl:
+                return entry[1]
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                future, leader = self._claim(key)
+                if leader:
+                    self._refresher.submit(self._load, key, loader, future)
+                return entry[1]
+
+        future, leader = self._claim(key)
+        if leader:
+            self._load(key, loader, future)
+        return future.result()
+
+    def stats(self):
+        lookups = self._entries.hits + self._entries.misses
+        return {
+            "lookups": lookups,
+            "hits": self._entries.hits,
+            "stale_hits": self.stale_hits,
+            "upstream_loads": self.loads,
+            "hit_rate": self._entries.hits / lookups if lookups else 0.0,
+        }
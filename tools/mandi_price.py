@@ -1,15 +1,27 @@
 import requests
 import os
+import itertools
+import numpy as np
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from tools.weather_tool import get_location_coordinates
+from tools.http_client import http_get
+from tools.mandi_registry import record_distances_km
+from tools.array_ops import top_k_indices
+from tools.mandi_ranking import rank_by_effective_cost
+from tools.agmarknet_store import AGMARKNET_PAGE_SIZE, fetch_agmarknet_page, get_snapshot, iter_agmarknet_records
 from langchain_core.tools import tool
 from pydantic import BaseModel
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 GOV_API = os.getenv("GOV_API")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  
+MANDI_ROAD_DISTANCE_CANDIDATES = int(os.getenv("MANDI_ROAD_DISTANCE_CANDIDATES", "15"))
+# Optional cap on filter combinations queried at once (later, less specific ones wait and are
+# cancelled if not needed). Unset or 0 queries every combination at once: one round trip at worst.
+MANDI_FILTER_CONCURRENCY = int(os.getenv("MANDI_FILTER_CONCURRENCY", "0")) or None
 
 class MandiTravelInput(BaseModel):
     state: Optional[str] = None
@@ -30,7 +42,7 @@ def get_travel_distance_km(origin_lat, origin_lon, destination):
         "destinations": destination,
         "key": GOOGLE_API_KEY
     }
-    res = requests.get(url, params=params).json()
+    res = http_get(url, params=params).json()
     try:
         distance_meters = res["rows"][0]["elements"][0]["distance"]["value"]
         return distance_meters / 1000.0  # convert to km
@@ -38,6 +50,147 @@ def get_travel_distance_km(origin_lat, origin_lon, destination):
         print("Distance fetch failed:", e)
         return None
 
+DISTANCE_MATRIX_MAX_DESTINATIONS = 25
+
+def get_travel_distances_km(origin_lat, origin_lon, destinations):
+    """
+    Batched version of `get_travel_distance_km` for one origin and many destinations.
+
+    Identical destination strings are requested once, and the unique destinations are
+    sent to the Distance Matrix API in chunks of at most 25 (the per-request limit).
+    Returns a list of distances in km aligned with `destinations`; entries that could
+    not be resolved are None.
+    """
+    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
+    unique_destinations = list(dict.fromkeys(destinations))
+    distance_by_destination = {}
+
+    for start in range(0, len(unique_destinations), DISTANCE_MATRIX_MAX_DESTINATIONS):
+        chunk = unique_destinations[start:start + DISTANCE_MATRIX_MAX_DESTINATIONS]
+        params = {
+            "origins": f"{origin_lat},{origin_lon}",
+            "destinations": "|".join(chunk),
+            "key": GOOGLE_API_KEY
+        }
+        try:
+            res = http_get(url, params=params).json()
+            elements = res["rows"][0]["elements"]
+        except Exception as e:
+            print("Distance fetch failed:", e)
+            continue
+
+        for destination, element in zip(chunk, elements):
+            if element.get("status") == "OK":
+                distance_by_destination[destination] = element["distance"]["value"] / 1000.0
+
+    return [distance_by_destination.get(d) for d in destinations]
+
+def fetch_mandi_page(filters):
+    """
+    Returns the first page of Agmarknet records matching `filters` together with the
+    overall `total`, answered from the local columnar snapshot when a fresh one exists
+    and from the live API otherwise.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        rows = snapshot.query_rows(**filters)
+        return {"records": snapshot.to_records(rows[:AGMARKNET_PAGE_SIZE]), "total": len(rows)}
+    return fetch_agmarknet_page(filters, limit=AGMARKNET_PAGE_SIZE)
+
+def iter_mandi_records(filters, first_page=None):
+    """
+    Streams all records matching `filters` (not just the first page) from the
+    snapshot or, page by page, from the live API.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        yield from snapshot.iter_records(**filters)
+    else:
+        yield from iter_agmarknet_records(filters, first_page=first_page)
+
+def get_mandi_location(rec):
+    return f"{rec.get('market')}, {rec.get('district')}, {rec.get('state')}"
+
+def select_nearest_records(records, lat, lon, n=MANDI_ROAD_DISTANCE_CANDIDATES, batch_size=AGMARKNET_PAGE_SIZE):
+    """
+    Keeps only the `n` records whose mandis are nearest to (lat, lon) by great-circle
+    distance, using the persistent mandi registry, so road distances are requested
+    for those candidates only. `records` may be any iterable; it is consumed in
+    batches and each batch is merged into the running nearest `n` with `argpartition`.
+    """
+    nearest, nearest_km = [], np.empty(0)
+    unlocated = []
+    records = iter(records)
+    for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+        batch_km = record_distances_km(batch, lat, lon)
+        located = ~np.isnan(batch_km)
+        if len(unlocated) < n:
+            unlocated.extend(rec for rec, ok in zip(batch, located) if not ok)
+
+        pool = nearest + [rec for rec, ok in zip(batch, located) if ok]
+        pool_km = np.concatenate([nearest_km, batch_km[located]])
+        keep = top_k_indices(pool_km, np.ones(len(pool_km), dtype=bool), n)
+        nearest, nearest_km = [pool[i] for i in keep], pool_km[keep]
+
+    if not nearest:
+        return unlocated[:n]
+    return nearest
+
+def rank_mandi_records(records, farmer_lat, farmer_lon):
+    """
+    Ranks Agmarknet records (any iterable, e.g. `iter_mandi_records`) by total effective
+    cost (modal price + travel cost at ₹30/km) from the farmer's location and returns
+    the 5 cheapest as result dicts.
+    """
+    records = select_nearest_records(records, farmer_lat, farmer_lon)
+    distances = get_travel_distances_km(farmer_lat, farmer_lon, [get_mandi_location(rec) for rec in records])
+    return rank_by_effective_cost(records, distances, k=5)
+
+def iter_filter_matches(filter_combinations, fetch=fetch_mandi_page, max_workers=MANDI_FILTER_CONCURRENCY):
+    """
+    Progressive filter resolution.
+
+    `filter_combinations` is ordered from most to least specific. First pages of the
+    distinct combinations are all fetched at once, so the worst case is a single
+    round trip; with `max_workers`, only that many are in flight and the next less
+    specific queries start as more specific ones finish. Yields `(filters, first_page)` for each combination with records, most
+    specific first; when the caller stops iterating, queries that have not started
+    yet are cancelled.
+    """
+    unique = {}
+    for filters in filter_combinations:
+        effective = {k: v for k, v in filters.items() if v}
+        unique.setdefault(tuple(sorted(effective.items())), effective)
+    candidates = list(unique.values())
+    if not candidates:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers or len(candidates), len(candidates)))
+    try:
+        futures = [executor.submit(fetch, filters) for filters in candidates]
+        for filters, future in zip(candidates, futures):
+            try:
+                page = future.result()
+            except Exception as e:
+                print(f"Mandi query failed for {filters}: {e}")
+                continue
+            if page.get("records"):
+                yield filters, page
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def rank_progressive_filters(filter_combinations, farmer_lat, farmer_lon):
+    """
+    Ranks the records of the most specific filter combination that yields any ranked
+    mandis, falling back to the next combination when ranking leaves nothing (no
+    valid price or distance). Returns `(filters, ranked)`, or `(None, [])`.
+    """
+    for filters, first_page in iter_filter_matches(filter_combinations):
+        ranked = rank_mandi_records(iter_mandi_records(filters, first_page), farmer_lat, farmer_lon)
+        if ranked:
+            return filters, ranked
+    return None, []
+
 @tool(args_schema=TravelDistanceInput)
 def get_travel_distance_km_tool(origin_lat: float, origin_lon: float, destination: str) -> dict:
     """
@@ -147,10 +300,16 @@ def get_mandi_prices_with_travel(farmer_lat: float,
 
     Notes:
     ------
-    - Travel distance is estimated using Google Maps API (via helper `get_travel_distance_km`).
-    - Travel cost is calculated at ₹30/km, which can be changed based on local logistics.
+    - Candidates are first ranked by great-circle distance using the local mandi registry, and only the
+      nearest `MANDI_ROAD_DISTANCE_CANDIDATES` (default 15) are sent for road distances.
+    - Travel distance is estimated using Google Maps API (via helper `get_travel_distances_km`, batched per request).
+    - Travel cost is calculated at ₹30/km, which can be changed via `MANDI_TRAVEL_COST_PER_KM`.
     - Records without valid price or distance are filtered out.
+    - All matching records are considered: the live API is paged through `total`/`offset` and streamed,
+      with a running top-k selection keeping only the nearest candidates.
     - Results are sorted by `total_effective_cost` (cheapest to most expensive).
+    - Records come from the local Agmarknet snapshot (`python -m tools.agmarknet_store`) when it is fresh,
+      otherwise from the live API.
     - Requires valid `GOV_API` key set via environment variable.
 
     Errors:
@@ -158,57 +317,15 @@ def get_mandi_prices_with_travel(farmer_lat: float,
     - If the API call fails or returns no data, a user-friendly message is returned.
     - If price or distance is missing, those entries are skipped in the final result.
     """
-    API_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
-    limit=100
-    params = {
-        "api-key": GOV_API,
-        "format": "json",
-        "limit": limit,
-        "offset": 0
-    }
-    if state: params["filters[state.keyword]"] = state
-    if district: params["filters[district.keyword]"] = district
-    if market: params["filters[market.keyword]"] = market
-    if commodity: params["filters[commodity.keyword]"] = commodity
-    if variety: params["filters[variety.keyword]"] = variety
-
-    response = requests.get(API_URL, params=params)
-    if response.status_code != 200:
-        return {"error": f"HTTP {response.status_code}", "details": response.text}
-    
-    records = response.json().get("records", [])
-    if not records:
+    filters = {"state": state, "district": district, "market": market, "commodity": commodity, "variety": variety}
+    try:
+        first_page = fetch_mandi_page(filters)
+    except requests.HTTPError as e:
+        return {"error": f"HTTP {e.response.status_code}", "details": e.response.text}
+    if not first_page.get("records"):
         return {"message": "No mandi data found for the given filters."}
 
-    results = []
-    for rec in records:
-        try:
-            modal_price = int(rec.get("modal_price", 0))
-        except:
-            modal_price = 0
-
-        mandi_location = f"{rec.get('market')}, {rec.get('district')}, {rec.get('state')}"
-        distance_km = get_travel_distance_km(farmer_lat, farmer_lon, mandi_location)
-        travel_cost = round(distance_km * 30, 2) if distance_km else None  
-        total_cost = modal_price + travel_cost if modal_price and travel_cost else None
-
-        results.append({
-            "state": rec.get("state"),
-            "district": rec.get("district"),
-            "market": rec.get("market"),
-            "arrival_date": rec.get("arrival_date"),
-            "commodity": rec.get("commodity"),
-            "variety": rec.get("variety"),
-            "modal_price_per_quintal": modal_price,
-            "travel_distance_km": round(distance_km, 1) if distance_km else None,
-            "estimated_travel_cost": travel_cost,
-            "total_effective_cost": total_cost
-        })
-
-    results = [r for r in results if r["total_effective_cost"] is not None]
-    results.sort(key=lambda x: x["total_effective_cost"])
-    
-    return results[:5]  
+    return rank_mandi_records(iter_mandi_records(filters, first_page), farmer_lat, farmer_lon)  
 
 @tool(args_schema=MandiTravelInput)
 def get_mandi_prices_tool(
@@ -265,25 +382,19 @@ def get_mandi_prices_tool(
 
     Notes
     -----
-    - The function attempts filtering in the following order:
+    - All filter combinations are queried concurrently; the most specific one with results is used,
+      in the following order of preference:
         1. state, district, market, commodity, variety
         2. state, district, market, commodity
         3. state, district, commodity
         4. state, commodity
     - At minimum, `state` and `commodity` must be provided to get any results.
     - Prices returned are modal prices per quintal unless otherwise specified.
+    - Only the mandis nearest to the resolved location (by great-circle distance) are ranked by road distance.
     - Market refers to the **local mandi center** typically located in a village or town.
     """
 
-    API_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
-    limit = 100
     lat,lon,_=get_location_coordinates(state, district,market)
-    base_params = {
-        "api-key": GOV_API,
-        "format": "json",
-        "limit": limit,
-        "offset": 0
-    }
     filter_combinations = [
         {"state": state, "district": district, "market": market, "commodity": commodity, "variety": variety},
         {"state": state, "district": district, "market": market, "commodity": commodity},
@@ -291,48 +402,9 @@ def get_mandi_prices_tool(
         {"state": state, "commodity": commodity}
     ]
 
-    for filters in filter_combinations:
-        if not filters["state"] or not filters["commodity"]:
-            continue
-
-        params = base_params.copy()
-        if filters.get("state"): params["filters[state.keyword]"] = filters["state"]
-        if filters.get("district"): params["filters[district.keyword]"] = filters["district"]
-        if filters.get("market"): params["filters[market.keyword]"] = filters["market"]
-        if filters.get("commodity"): params["filters[commodity.keyword]"] = filters["commodity"]
-        if filters.get("variety"): params["filters[variety.keyword]"] = filters["variety"]
+    filter_combinations = [f for f in filter_combinations if f["state"] and f["commodity"]]
+    filters_used, ranked = rank_progressive_filters(filter_combinations, lat, lon)
+    if filters_used is None:
+        return {"error": "No data found with available filter combinations"}
 
-        response = requests.get(API_URL, params=params)
-        if response.status_code != 200:
-            continue  
-
-        records = response.json().get("records", [])
-    results = []
-    for rec in records:
-        try:
-            modal_price = int(rec.get("modal_price", 0))
-        except:
-            modal_price = 0
-
-        mandi_location = f"{rec.get('market')}, {rec.get('district')}, {rec.get('state')}"
-        distance_km = get_travel_distance_km(lat, lon, mandi_location)
-        travel_cost = round(distance_km * 30, 2) if distance_km else None  
-        total_cost = modal_price + travel_cost if modal_price and travel_cost else None
-
-        results.append({
-            "state": rec.get("state"),
-            "district": rec.get("district"),
-            "market": rec.get("market"),
-            "arrival_date": rec.get("arrival_date"),
-            "commodity": rec.get("commodity"),
-            "variety": rec.get("variety"),
-            "modal_price_per_quintal": modal_price,
-            "travel_distance_km": round(distance_km, 1) if distance_km else None,
-            "estimated_travel_cost": travel_cost,
-            "total_effective_cost": total_cost
-        })
-
-    results = [r for r in results if r["total_effective_cost"] is not None]
-    results.sort(key=lambda x: x["total_effective_cost"])
-
-    return results[:5]  
\ No newline at end of file
+    return ranked  
\ No newline at end of file
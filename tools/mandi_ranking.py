@@ -0,0 +1,61 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from tools.array_ops import top_k_indices
+
+load_dotenv()
+TRAVEL_COST_PER_KM = float(os.getenv("MANDI_TRAVEL_COST_PER_KM", "30"))
+
+
+def parse_prices(values):
+    """
+    Parses Agmarknet modal prices into a float array with the old `int(...)` rule:
+    numbers are truncated to integers, strings must be plain non-negative integers,
+    and anything else (missing, NaN, "12.5", "NR") becomes 0.
+    """
+    prices = np.zeros(len(values), dtype=np.float64)
+    string_rows = [i for i, v in enumerate(values) if isinstance(v, str)]
+    if string_rows:
+        arr = np.char.strip(np.asarray([values[i] for i in string_rows], dtype=str))
+        valid = np.char.isdigit(arr)
+        prices[np.asarray(string_rows)[valid]] = arr[valid].astype(np.float64)
+    number_rows = [i for i, v in enumerate(values) if isinstance(v, (int, float, np.number)) and not isinstance(v, bool)]
+    if number_rows:
+        numbers = np.asarray([values[i] for i in number_rows], dtype=np.float64)
+        prices[number_rows] = np.where(np.isfinite(numbers), np.trunc(numbers), 0.0)
+    return prices
+
+
+def travel_costs(distances_km, cost_per_km=TRAVEL_COST_PER_KM):
+    return np.round(distances_km * cost_per_km, 2)
+
+
+def rank_by_effective_cost(records, distances_km, k=5, cost_per_km=TRAVEL_COST_PER_KM):
+    """
+    Ranks `records` by modal price plus travel cost and returns the `k` cheapest in
+    the mandi tool output schema. `distances_km` is aligned with `records`, with
+    None/NaN for mandis whose distance is unknown; those and records without a
+    valid price are left out.
+    """
+    prices = parse_prices([rec.get("modal_price") for rec in records])
+    distances = np.array([np.nan if d is None else d for d in distances_km], dtype=np.float64)
+    travel = travel_costs(distances, cost_per_km)
+    total = prices + travel
+    valid = (prices > 0) & np.isfinite(distances)
+
+    results = []
+    for i in top_k_indices(total, valid, k):
+        rec = records[i]
+        results.append({
+            "state": rec.get("state"),
+            "district": rec.get("district"),
+            "market": rec.get("market"),
+            "arrival_date": rec.get("arrival_date"),
+            "commodity": rec.get("commodity"),
+            "variety": rec.get("variety"),
+            "modal_price_per_quintal": int(prices[i]),
+            "travel_distance_km": round(float(distances[i]), 1),
+            "estimated_travel_cost": float(travel[i]),
+            "total_effective_cost": float(total[i])
+        })
+    return results
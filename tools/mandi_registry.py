@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from tools.weather_tool import GeocodingError, get_location_coordinates
+
+load_dotenv()
+MANDI_REGISTRY_PATH = os.getenv("MANDI_REGISTRY_PATH", os.path.join("data", "mandi_registry.sqlite"))
+EARTH_RADIUS_KM = 6371.0088
+
+_lock = threading.Lock()
+
+
+def _connect():
+    directory = os.path.dirname(MANDI_REGISTRY_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(MANDI_REGISTRY_PATH, check_same_thread=False)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mandis (
+            state TEXT NOT NULL,
+            district TEXT NOT NULL,
+            market TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            PRIMARY KEY (state, district, market)
+        )
+        """
+    )
+    return conn
+
+
+def mandi_key(rec):
+    return (rec.get("state") or "", rec.get("district") or "", rec.get("market") or "")
+
+
+# In-process copy of the whole registry; it holds a few thousand mandis at most.
+_registry = None
+
+
+def _load_registry():
+    global _registry
+    if _registry is None:
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT state, district, market, latitude, longitude FROM mandis").fetchall()
+        finally:
+            conn.close()
+        _registry = {row[:3]: (row[3], row[4]) if row[3] is not None else None for row in rows}
+    return _registry
+
+
+def _lookup(keys):
+    with _lock:
+        registry = _load_registry()
+        return {key: registry[key] for key in keys if key in registry}
+
+
+def _store(entries):
+    with _lock:
+        conn = _connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO mandis (state, district, market, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+                [(*key, *(coords if coords else (None, None))) for key, coords in entries.items()],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _load_registry().update(entries)
+
+
+# Returned by `_geocode` when the failure may be temporary (timeout, quota, 5xx).
+_UNRESOLVED = object()
+
+
+def _geocode(key):
+    """(lat, lon); None when the geocoder definitively has no result; `_UNRESOLVED` otherwise."""
+    state, district, market = key
+    try:
+        lat, lon, _ = get_location_coordinates(state, district, market)
+        return lat, lon
+    except GeocodingError as e:
+        print(f"Mandi geocoding failed for {market}, {district}, {state}: {e}")
+        return None if e.status == "ZERO_RESULTS" else _UNRESOLVED
+    except Exception as e:
+        print(f"Mandi geocoding failed for {market}, {district}, {state}: {e}")
+        return _UNRESOLVED
+
+
+def populate_registry(records, max_workers=8):
+    """
+    Geocodes every (state, district, market) in `records` that is not yet in the registry.
+
+    Mandis the geocoder has no result for (ZERO_RESULTS) are stored with empty
+    coordinates so they are never looked up again; transient failures are not
+    recorded and are retried on the next call. Returns the number of newly
+    registered mandis.
+    """
+    keys = list(dict.fromkeys(mandi_key(rec) for rec in records))
+    known = _lookup(keys)
+    missing = [key for key in keys if key not in known]
+    if not missing:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        coords = list(executor.map(_geocode, missing))
+
+    resolved = {key: value for key, value in zip(missing, coords) if value is not _UNRESOLVED}
+    if resolved:
+        _store(resolved)
+    return len(resolved)
+
+
+def get_mandi_coordinates(records):
+    """
+    Returns a list of (lat, lon) tuples aligned with `records`, or None for mandis
+    that could not be located. Unknown mandis are geocoded once and persisted.
+    """
+    populate_registry(records)
+    keys = [mandi_key(rec) for rec in records]
+    known = _lookup(list(dict.fromkeys(keys)))
+    return [known.get(key) for key in keys]
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def record_distances_km(records, lat, lon):
+    """
+    Great-circle distances in km from (lat, lon) to the mandi of each record, as a
+    float array aligned with `records`; NaN where the mandi could not be located.
+    """
+    coords = get_mandi_coordinates(records)
+    lats = np.array([c[0] if c else np.nan for c in coords], dtype=float)
+    lons = np.array([c[1] if c else np.nan for c in coords], dtype=float)
+    return haversine_km(lat, lon, lats, lons)
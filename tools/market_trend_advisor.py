@@ -6,7 +6,7 @@ from llm_service.service import llm_3
 from typing import List
 from langchain_core.tools import tool
 from langchain.output_parsers import PydanticOutputParser
-from tools.mandi_price import get_mandi_prices_with_travel
+from tools.mandi_price import rank_progressive_filters
 from tools.scheme_advisor import govt_scheme_advisor_pipeline, govt_scheme_advisor_pipeline_query
 from tools.weather_tool import get_location_coordinates
 from tools.soil_info_provider import get_soil_info_lati_longi
@@ -99,50 +99,15 @@ def generate_query_based_on_query(farmer_query) -> list:
     return structured.query
 
 def fetch_mandi_data(crop, lat, lon, state, district=None, market=None):
-    def normalize_and_validate(data):
-        # Remove invalid response
-        if isinstance(data, dict) and "message" in data:
-            return []
-        if isinstance(data, dict):
-            return [data]
-        if isinstance(data, list):
-            return data
-        return []
-
-    # 1. Try with state + district + market
-    data = get_mandi_prices_with_travel(
-        farmer_lat=lat,
-        farmer_lon=lon,
-        state=state,
-        district=district,
-        market=market,
-        commodity=crop
-    )
-    mandi_data = normalize_and_validate(data)
-    if mandi_data:
-        return crop, mandi_data
-
-    # 2. Try with state + district
-    data = get_mandi_prices_with_travel(
-        farmer_lat=lat,
-        farmer_lon=lon,
-        state=state,
-        district=district,
-        commodity=crop
-    )
-    mandi_data = normalize_and_validate(data)
-    if mandi_data:
-        return crop, mandi_data
-
-    # 3. Try with state only
-    data = get_mandi_prices_with_travel(
-        farmer_lat=lat,
-        farmer_lon=lon,
-        state=state,
-        commodity=crop
-    )
-    mandi_data = normalize_and_validate(data)
-    return crop, mandi_data
+    # Most specific first: state + district + market, then state + district, then state only.
+    # The next combinations are fetched ahead while a more specific one is ranked.
+    filter_combinations = [
+        {"state": state, "district": district, "market": market, "commodity": crop},
+        {"state": state, "district": district, "commodity": crop},
+        {"state": state, "commodity": crop},
+    ]
+    _, ranked = rank_progressive_filters(filter_combinations, lat, lon)
+    return crop, ranked
 
 
 
@@ -3,10 +3,10 @@ from llm_service.service import llm_3
 from langchain_core.tools import tool
 from langchain.output_parsers import PydanticOutputParser
 from langchain_core.messages import HumanMessage
+from tools.http_client import http_get
 from typing import Dict
 from PIL import Image
 import base64
-import requests
 from io import BytesIO
 import re
 
@@ -15,7 +15,7 @@ llm = llm_3
 # ---------- Image Loader ----------
 def load_image(path_or_url_or_base64: str) -> Image.Image:
     if path_or_url_or_base64.startswith("http://") or path_or_url_or_base64.startswith("https://"):
-        response = requests.get(path_or_url_or_base64)
+        response = http_get(path_or_url_or_base64)
         response.raise_for_status()
         return Image.open(BytesIO(response.content))
     elif path_or_url_or_base64.startswith("data:image"):
@@ -1,34 +1,53 @@
 import os
-import requests
 import asyncio
-import aiohttp
+import threading
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from langchain_core.tools import tool
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import firestore
-from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-from google.cloud.firestore_v1.vector import Vector
-from sentence_transformers import SentenceTransformer
-import numpy as np
 from langchain.output_parsers import PydanticOutputParser
 from llm_service.service import llm_3
 from pydantic import BaseModel
 from typing import List
+from tools.http_client import http_get, async_http_get, close_async_session, get_host_semaphore
+from tools.scheme_store import CENTRAL_SCHEME_STATE, ingest_scheme_documents
+from tools.scrape_cache import SCRAPE_MAX_PER_HOST, scrape_cache
+from tools.search_cache import cached_search, collapse_near_duplicates
+from tools.embedding_cache import EmbeddingCache
+from tools.vector_store import VECTOR_STORE_BACKEND, FirestoreVectorStore, LocalVectorStore
 
 llm=llm_3
 load_dotenv()
 CSE_API_KEY = os.getenv("CSE_API_KEY")
 CSE_ID = os.getenv("CSE_ID")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# Load the embedding model and Firestore client on a background thread at app startup.
+SCHEME_WARMUP_ON_STARTUP = os.getenv("SCHEME_WARMUP_ON_STARTUP", "false").lower() == "true"
+SCHEME_SEARCH_CONCURRENCY = int(os.getenv("SCHEME_SEARCH_CONCURRENCY", "4"))
+SCHEME_LLM_CONCURRENCY = int(os.getenv("SCHEME_LLM_CONCURRENCY", "5"))
+# Passages of one page kept as its retrieval context.
+SCHEME_PASSAGES_PER_DOCUMENT = int(os.getenv("SCHEME_PASSAGES_PER_DOCUMENT", "2"))
+# Upper bound on passages fetched per retrieval while looking for `top_k` distinct pages.
+SCHEME_MAX_RETRIEVED_PASSAGES = int(os.getenv("SCHEME_MAX_RETRIEVED_PASSAGES", "320"))
+# "fallback": live search + scrape only when retrieval from the ingested corpus
+# (tools.scheme_corpus) looks weak; "always": on every query; "never": retrieval only.
+SCHEME_LIVE_SEARCH = os.getenv("SCHEME_LIVE_SEARCH", "fallback").lower()
+SCHEME_MIN_RETRIEVED_DOCUMENTS = int(os.getenv("SCHEME_MIN_RETRIEVED_DOCUMENTS", "3"))
+SCHEME_MIN_RETRIEVAL_SCORE = float(os.getenv("SCHEME_MIN_RETRIEVAL_SCORE", "0.35"))
+# "packed": all retrieved documents in one structured call; "per_document": one call each.
+SCHEME_KEYPOINT_MODE = os.getenv("SCHEME_KEYPOINT_MODE", "packed").lower()
+# Estimated prompt tokens the packed call may use; documents are trimmed to fit,
+# and the per-document path is used when even trimmed documents do not fit.
+SCHEME_KEYPOINT_TOKEN_BUDGET = int(os.getenv("SCHEME_KEYPOINT_TOKEN_BUDGET", "6000"))
+SCHEME_KEYPOINT_MIN_DOCUMENT_TOKENS = int(os.getenv("SCHEME_KEYPOINT_MIN_DOCUMENT_TOKENS", "150"))
 
 
 class SearchSentences(BaseModel):
     search_phrases: List[str]
 
-def extract_intent_and_topic(query: str) -> dict:
-    parser = PydanticOutputParser(pydantic_object=SearchSentences)
-    prompt = f"""
+def intent_prompt(query, parser):
+    return f"""
     You are an expert in Indian agriculture schemes and search optimization.
 
     Given the farmer's **profile** and their **query**, generate a list of 5 to 7 natural language **search queries** or phrases that a person might enter into Google to get the most relevant answers.
@@ -44,236 +63,353 @@ def extract_intent_and_topic(query: str) -> dict:
         Respond in this JSON format:
         {parser.get_format_instructions()}
     """
-    response = llm.invoke(prompt)
+
+def extract_intent_and_topic(query: str) -> dict:
+    parser = PydanticOutputParser(pydantic_object=SearchSentences)
+    response = llm.invoke(intent_prompt(query, parser))
+    structured = parser.parse(response.content)
+    return structured.model_dump()
+
+async def aextract_intent_and_topic(query: str) -> dict:
+    parser = PydanticOutputParser(pydantic_object=SearchSentences)
+    response = await llm.ainvoke(intent_prompt(query, parser))
     structured = parser.parse(response.content)
     return structured.model_dump()
 
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-firestore_client = firestore.Client()
-vector_collection = firestore_client.collection("government_schemes")
+_embedding_model = None
+_firestore_client = None
+_embedding_model_lock = threading.Lock()
+_firestore_client_lock = threading.Lock()
 
-def normalize(vec):
-    norm = np.linalg.norm(vec)
-    return (vec / norm).tolist() if norm != 0 else vec
+def get_embedding_model():
+    """
+    Shared SentenceTransformer, loaded on first use. sentence_transformers (and
+    torch) are imported here so that importing this module stays cheap.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+def get_firestore_client():
+    global _firestore_client
+    if _firestore_client is None:
+        with _firestore_client_lock:
+            if _firestore_client is None:
+                _firestore_client = firestore.Client()
+    return _firestore_client
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store():
+    """The scheme vector store selected by `VECTOR_STORE_BACKEND`, created on first use."""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                if VECTOR_STORE_BACKEND == "local":
+                    _vector_store = LocalVectorStore()
+                else:
+                    _vector_store = FirestoreVectorStore(get_firestore_client())
+    return _vector_store
+
+def group_passages_by_page(hits, top_k):
+    pages = {}
+    for d in hits:
+        parent = d.get("parent_id") or d.get("url")
+        if parent not in pages:
+            if len(pages) == top_k:
+                continue
+            pages[parent] = {
+                "title": d.get("title"), "source": d.get("source"), "url": d.get("url"), "score": d.get("score"), "passages": []
+            }
+        if len(pages[parent]["passages"]) < SCHEME_PASSAGES_PER_DOCUMENT:
+            # Items stored before chunking hold the whole page in `full_content`.
+            pages[parent]["passages"].append((d.get("passage_index", 0), d.get("passage") or d.get("full_content")))
+    return pages
+
+def search_passages(query_vec, k, state=None, farmer_id=None):
+    store = get_vector_store()
+    if not state or state == CENTRAL_SCHEME_STATE:
+        return store.search(query_vec, k, state=state, farmer_id=farmer_id)
+    hits = store.search(query_vec, k, state=state, farmer_id=farmer_id)
+    hits += store.search(query_vec, k, state=CENTRAL_SCHEME_STATE, farmer_id=farmer_id)
+    hits.sort(key=lambda d: d.get("score") or 0.0, reverse=True)
+    return hits[:k]
+
+def retrieve_scheme_documents(query, top_k=5, state=None, farmer_id=None):
+    """
+    The `top_k` best-matching pages for `query`, ranked by their best passage.
+    Each page's `content` is only its top `SCHEME_PASSAGES_PER_DOCUMENT` passages,
+    in page order, rather than the whole scraped text. With `state`, only that
+    state's and central (`CENTRAL_SCHEME_STATE`) documents are searched, in two
+    searches merged by score. Passages are over-fetched,
+    doubling up to `SCHEME_MAX_RETRIEVED_PASSAGES`, until `top_k` distinct pages
+    are found, so a few pages with many matching passages cannot crowd out the rest.
+    """
+    query_vec = embed_texts([query])[0]
+    k = top_k * SCHEME_PASSAGES_PER_DOCUMENT * 4
+    while True:
+        hits = search_passages(query_vec, k, state, farmer_id)
+        pages = group_passages_by_page(hits, top_k)
+        if len(pages) >= top_k or len(hits) < k or k >= SCHEME_MAX_RETRIEVED_PASSAGES:
+            break
+        k = min(2 * k, SCHEME_MAX_RETRIEVED_PASSAGES)
+    return [{
+        "title": page["title"],
+        "content": "\n...\n".join(text for _, text in sorted(page["passages"])),
+        "source": page["source"],
+        "url": page["url"],
+        "score": page["score"]
+    } for page in pages.values()]
+
+def warm_up_scheme_resources(background=True):
+    """
+    Loads the embedding model and Firestore client ahead of the first scheme
+    query. With `background=True` this runs on a daemon thread so app startup
+    is not blocked; requests that arrive first wait on the same locks.
+    """
+    def load():
+        try:
+            get_embedding_model()
+            get_firestore_client()
+        except Exception as e:
+            print(f"Scheme advisor warm-up failed: {e}")
+
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name="scheme-warmup", daemon=True)
+    thread.start()
+    return thread
+
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL_NAME)
+
+def embed_texts(texts):
+    """Unit-normalized embeddings; only texts not already in `embedding_cache` reach the model."""
+    return embedding_cache.encode(
+        texts,
+        lambda batch: get_embedding_model().encode(batch, batch_size=16, show_progress_bar=False, normalize_embeddings=True),
+    )
+
+def extract_paragraph_text(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    paragraphs = soup.find_all('p')
+    return "\n".join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
 
 # Async scraping setup
-async def async_scrape(session, url):
+async def async_scrape(url):
+    """
+    Paragraph text of `url`, served from `scrape_cache` while fresh and revalidated
+    with a conditional GET (ETag / Last-Modified) once the TTL has passed. At most
+    `SCRAPE_MAX_PER_HOST` requests per host are in flight on the loop; cache I/O
+    and HTML parsing run in worker threads so they never stall the shared loop.
+    """
+    entry = await asyncio.to_thread(scrape_cache.get, url)
+    if entry is not None and scrape_cache.is_fresh(entry):
+        scrape_cache.hits += 1
+        return entry["text"]
+
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
     try:
-        async with session.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"}) as res:
-            text = await res.text()
-            soup = BeautifulSoup(text, 'html.parser')
-            paragraphs = soup.find_all('p')
-            return "\n".join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
+        async with get_host_semaphore(url, SCRAPE_MAX_PER_HOST):
+            res = await async_http_get(url, timeout=10, retries=1, headers=headers)
+        if res.status_code == 304 and entry is not None:
+            scrape_cache.revalidated += 1
+            await asyncio.to_thread(scrape_cache.mark_revalidated, url)
+            return entry["text"]
+        scrape_cache.misses += 1
+        text = await asyncio.to_thread(extract_paragraph_text, res.text)
+        if res.status_code == 200:
+            await asyncio.to_thread(scrape_cache.set, url, text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+        return text
     except Exception as e:
+        if entry is not None:
+            # Stale text beats no text when the portal is down.
+            return entry["text"]
         return f"[Error scraping: {str(e)}]"
 
-async def batch_scrape(urls):
-    async with aiohttp.ClientSession() as session:
-        tasks = [async_scrape(session, url) for url in urls]
-        return await asyncio.gather(*tasks)
+def fetch_search_items(q):
+    url = "https://www.googleapis.com/customsearch/v1"
+    response = http_get(url, params={"q": q, "key": CSE_API_KEY, "cx": CSE_ID})
+    response.raise_for_status()
+    return [{
+        "title": i["title"],
+        "link": i["link"],
+        "snippet": i.get("snippet", "")
+    } for i in response.json().get("items", [])]
 
 def google_search(q, num_results=5):
-    url = f"https://www.googleapis.com/customsearch/v1?q={q}&key={CSE_API_KEY}&cx={CSE_ID}"
     try:
-        results = requests.get(url).json()
-        return [{
-            "title": i["title"],
-            "link": i["link"],
-            "snippet": i.get("snippet", "")
-        } for i in results.get("items", [])[:num_results]]
+        return cached_search(q, fetch_search_items)[:num_results]
     except Exception as e:
         print(f"Search failed: {e}")
         return []
 
-def govt_scheme_advisor_pipeline_query(query, top_k=5):
-    intent_data = extract_intent_and_topic(query)
-    intents = intent_data["search_phrases"]
-    farmer_id = "abc"
-
-    # --- Parallel Google Search ---
-    with ThreadPoolExecutor() as executor:
-        search_results = list(executor.map(google_search, intents))
-
-    all_scraped_metadata = [item for sublist in search_results for item in sublist]
-    urls = [r["link"] for r in all_scraped_metadata]
-
-    # --- Batch Scrape ---
-    full_texts = asyncio.run(batch_scrape(urls))
-
-    for meta, content in zip(all_scraped_metadata, full_texts):
-        meta["full_content"] = content
-        meta["source"] = "Google Search"
-        meta["scraped_at"] = datetime.utcnow().isoformat()
-
-    filtered = [r for r in all_scraped_metadata if len(r["full_content"].strip()) > 20]
-    texts = [r["full_content"] for r in filtered]
-
-    # --- Embeddings ---
-    embeddings = embedding_model.encode(texts, batch_size=16, show_progress_bar=False, normalize_embeddings=True)
-    embeddings = [normalize(e) for e in embeddings]
-
-    # --- Batch Vector DB Insert ---
-    docs_to_add = [{
-        **result,
-        "embedding": Vector(emb),
-        "farmer_id": farmer_id
-    } for result, emb in zip(filtered, embeddings)]
-
-    for doc in docs_to_add:
-        vector_collection.add(doc)
-
-    # --- Vector Retrieval ---
-    def retrieve(query):
-        query_vec = normalize(embedding_model.encode(query))
-        docs = vector_collection.find_nearest(
-            vector_field="embedding",
-            query_vector=Vector(query_vec),
-            distance_measure=DistanceMeasure.DOT_PRODUCT,
-            limit=top_k
-        ).stream()
-
-        return [{
-            "title": d.get("title"),
-            "content": d.get("full_content"),
-            "source": d.get("source"),
-            "url": d.get("url")
-        } for d in (doc.to_dict() for doc in docs)]
-
-    # --- LLM Prompt Helpers ---
-    def extract_relevant_points(doc, query):
-        prompt = f"""
-        Given the following scheme description and a farmer's query, extract 10 key bullet points that are most relevant to the query.
-
-        Query:
-        {query}
+async def search_and_scrape(phrases, num_results=5):
+    """
+    Searches each distinct phrase (near-duplicates collapsed) with at most
+    `SCHEME_SEARCH_CONCURRENCY` CSE calls in flight, and starts scraping a phrase's
+    result pages as soon as its search returns. Returns the combined results, with
+    `full_content` filled in and no link repeated.
+    """
+    search_slots = asyncio.Semaphore(SCHEME_SEARCH_CONCURRENCY)
+    seen = set()
 
-        Scheme Title:
-        {doc['title']}
+    async def run(phrase):
+        async with search_slots:
+            items = await asyncio.to_thread(google_search, phrase, num_results)
+        new = [dict(item) for item in items if item["link"] not in seen]
+        seen.update(item["link"] for item in new)
+        texts = await asyncio.gather(*(async_scrape(item["link"]) for item in new))
+        for item, content in zip(new, texts):
+            item["full_content"] = content
+            item["source"] = "Google Search"
+            item["scraped_at"] = datetime.utcnow().isoformat()
+        return new
 
-        Scheme Description:
-        {doc['content']}
+    batches = await asyncio.gather(*(run(phrase) for phrase in collapse_near_duplicates(phrases)))
+    return [item for batch in batches for item in batch]
 
-        Return only the key points in simple bullet format.
-        """.strip()
-        response = llm.invoke(prompt)
-        return response.content
+def key_points_prompt(doc, query):
+    return f"""
+    Given the following scheme description and a farmer's query, extract 10 key bullet points that are most relevant to the query.
 
-    def extract_all_keypoints(docs, query):
-        with ThreadPoolExecutor() as executor:
-            results = list(executor.map(lambda doc: f"• {doc['title']}:\n{extract_relevant_points(doc, query)}", docs[:5]))
-        return "\n\n".join(results)
+    Query:
+    {query}
 
-    def build_prompt(query, context_docs, max_docs=5):
-        context = extract_all_keypoints(context_docs[:max_docs], query)
-        return f"""
-        You are an agricultural insights assistant that generates concise market updates for Indian farmers.
+    Scheme Title:
+    {doc['title']}
 
-        Analyze the following query and contextual data to produce a structured summary of relevant agricultural market trends. Focus on commodity price forecasts, demand-supply patterns, policy impacts, and international trade developments. The tone should be neutral, informative, and suitable for display in an agricultural advisory app.
+    Scheme Description:
+    {doc['content']}
 
-        ### User Query:
-        {query}
+    Return only the key points in simple bullet format.
+    """.strip()
 
-        ### Contextual Market Data:
-        {context}
+async def keypoint_sections_per_document(docs, query):
+    """One `• title:` section per document, each from its own LLM call."""
+    llm_slots = asyncio.Semaphore(SCHEME_LLM_CONCURRENCY)
 
-        Generate an **objective market trend update**, without directly addressing the user. Avoid conversational or second-person language.
-        """.strip()
+    async def extract(doc):
+        async with llm_slots:
+            response = await llm.ainvoke(key_points_prompt(doc, query))
+        return f"• {doc['title']}:\n{response.content}"
 
-    # --- Final Answer ---
-    retrieved = retrieve(query)
-    prompt = build_prompt(query, retrieved)
-    response = llm.invoke(prompt)
+    return list(await asyncio.gather(*(extract(doc) for doc in docs)))
 
-    return {
-        "query": query,
-        "answer": response.content,
-    }
-   
-def govt_scheme_advisor_pipeline(query, farmer_state, top_k=5):
-    intent_data = extract_intent_and_topic(query)
-    intents = intent_data["search_phrases"]
-    farmer_profile = farmer_state.get("profile", {}).get("farmer_profile", {})
-    name = farmer_profile.get("name", "Unknown")
-    village = farmer_profile.get("location", {}).get("village", "Unknown")
-    land_info = farmer_profile.get("land_info", {})
-    financial_profile = farmer_profile.get("financial_profile", {})
-    government_scheme_enrollments = farmer_profile.get("government_scheme_enrollments", {})
-    farmer_id = f"{name}_{village}".replace(" ", "_")
+async def extract_keypoints_per_document(docs, query):
+    return "\n\n".join(await keypoint_sections_per_document(docs, query))
 
-    # --- Scraping and storing ---
-    all_scraped_metadata = []
-    for intent in intents:
-        all_scraped_metadata.extend(google_search(intent))
-
-    urls = [r["link"] for r in all_scraped_metadata]
-    full_texts = asyncio.run(batch_scrape(urls))
-
-    for meta, content in zip(all_scraped_metadata, full_texts):
-        meta["full_content"] = content
-        meta["source"] = "Google Search"
-        meta["scraped_at"] = datetime.utcnow().isoformat()
-
-    filtered = [r for r in all_scraped_metadata if len(r["full_content"].strip()) > 20]
-    texts = [r["full_content"] for r in filtered]
-    embeddings = embedding_model.encode(texts, batch_size=16, show_progress_bar=False, normalize_embeddings=True)
-    embeddings = [normalize(e) for e in embeddings]
-
-    for result, emb in zip(filtered, embeddings):
-        doc = {
-            **result,
-            "embedding": Vector(emb),
-            "farmer_id": farmer_id
-        }
-        vector_collection.add(doc)
-        print(f"Stored: {result['title'][:60]}")
-
-    # --- Vector Retrieval ---
-    def retrieve(query):
-        query_vec = normalize(embedding_model.encode(query))
-        docs = vector_collection.find_nearest(
-            vector_field="embedding",
-            query_vector=Vector(query_vec),
-            distance_measure=DistanceMeasure.DOT_PRODUCT,
-            limit=top_k
-        ).stream()
-
-        return [{
-            "title": d.get("title"),
-            "content": d.get("full_content"),
-            "source": d.get("source"),
-            "url": d.get("url")
-        } for d in (doc.to_dict() for doc in docs)]
-
-    # --- Extract Key Points with LLM ---
-    def extract_relevant_points(doc, query):
-        prompt = f"""
-        Given the following scheme description and a farmer's query, extract 10 key bullet points that are most relevant to the query.
-
-        Query:
-        {query}
+class SchemeKeyPoints(BaseModel):
+    document: int
+    key_points: List[str]
 
-        Scheme Title:
-        {doc['title']}
+class PackedKeyPointsOutput(BaseModel):
+    schemes: List[SchemeKeyPoints]
 
-        Scheme Description:
-        {doc['content']}
+def estimate_tokens(text):
+    # ~4 characters per token for English prose; only used for budgeting.
+    return len(text) // 4 + 1
 
-        Return only the key points in simple bullet format.
-        """.strip()
-        response = llm.invoke(prompt)
-        return response.content
-
-    def extract_all_keypoints(docs, query):
-        results = []
-        for doc in docs:
-            bullet_points = extract_relevant_points(doc, query)
-            formatted = f"\u2022 {doc['title']}:\n{bullet_points}"
-            results.append(formatted)
-        return "\n\n".join(results)
-
-    def build_prompt(query, context_docs, max_docs=5):
-        context = extract_all_keypoints(context_docs[:max_docs], query)
-        return f"""
+def trim_to_tokens(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:(max_tokens - 1) * 4].rsplit(" ", 1)[0] + " ..."
+
+def pack_documents(docs, budget, min_tokens=SCHEME_KEYPOINT_MIN_DOCUMENT_TOKENS):
+    """
+    Trims document contents so their estimated tokens sum to at most `budget`:
+    short documents keep their full text and the rest share what remains
+    equally. Returns the trimmed documents, or None when `budget` cannot give
+    every document `min_tokens`.
+    """
+    if not docs or budget < min_tokens * len(docs):
+        return None
+    sizes = [estimate_tokens(doc["content"] or "") for doc in docs]
+    remaining, open_docs = budget, sorted(range(len(docs)), key=lambda i: sizes[i])
+    caps = {}
+    while open_docs:
+        share = remaining // len(open_docs)
+        i = open_docs[0]
+        if sizes[i] > share:
+            caps.update((j, share) for j in open_docs)
+            break
+        caps[i] = sizes[i]
+        remaining -= sizes[i]
+        open_docs.pop(0)
+    return [{**doc, "content": trim_to_tokens(doc["content"] or "", caps[i])} for i, doc in enumerate(docs)]
+
+def packed_key_points_prompt(docs, query, parser):
+    sections = "\n\n".join(
+        f"### Document {i}: {doc['title']}\n{doc['content']}" for i, doc in enumerate(docs, 1)
+    )
+    return f"""
+    Given the following scheme descriptions and a farmer's query, extract for each document up to 10 key points that are most relevant to the query.
+    Return one entry per document, using its document number, in the same order.
+
+    Query:
+    {query}
+
+    {sections}
+
+    Respond in this JSON format:
+    {parser.get_format_instructions()}
+    """.strip()
+
+async def extract_all_keypoints(docs, query):
+    """
+    Key points for the retrieved documents, as `• title:` sections. In "packed"
+    mode all documents go to the LLM in one structured call (map and reduce in a
+    single round trip), trimmed to `SCHEME_KEYPOINT_TOKEN_BUDGET`; when they cannot
+    fit, or the reply does not parse, it falls back to one call per document.
+    Documents the reply leaves out also get one call each; only the first entry
+    for each document number is kept. Sections follow the order of `docs`.
+    """
+    if SCHEME_KEYPOINT_MODE != "packed" or not docs:
+        return await extract_keypoints_per_document(docs, query)
+
+    parser = PydanticOutputParser(pydantic_object=PackedKeyPointsOutput)
+    overhead = estimate_tokens(packed_key_points_prompt([{"title": doc["title"], "content": ""} for doc in docs], query, parser))
+    packed = pack_documents(docs, SCHEME_KEYPOINT_TOKEN_BUDGET - overhead)
+    if packed is None:
+        return await extract_keypoints_per_document(docs, query)
+    try:
+        response = await llm.ainvoke(packed_key_points_prompt(packed, query, parser))
+        schemes = parser.parse(response.content).schemes
+    except Exception as e:
+        print(f"Packed key-point extraction failed, extracting per document: {e}")
+        return await extract_keypoints_per_document(docs, query)
+
+    sections = {}
+    for scheme in schemes:
+        if 1 <= scheme.document <= len(docs) and scheme.key_points and scheme.document - 1 not in sections:
+            points = "\n".join(f"- {point}" for point in scheme.key_points)
+            sections[scheme.document - 1] = f"• {docs[scheme.document - 1]['title']}:\n{points}"
+    missing = [i for i in range(len(docs)) if i not in sections]
+    if missing:
+        print(f"Packed key-point extraction left out {len(missing)} of {len(docs)} documents, extracting them per document")
+        sections.update(zip(missing, await keypoint_sections_per_document([docs[i] for i in missing], query)))
+    return "\n\n".join(sections[i] for i in range(len(docs)))
+
+def build_scheme_prompt(query, context, profile_sections=None, answer_instruction=None):
+    sections = "".join(
+        f"""
+
+        ### {heading}:
+        {value}""" for heading, value in (profile_sections or {}).items()
+    )
+    instruction = f"\n        {answer_instruction}" if answer_instruction else ""
+    return f"""
         You are an agricultural insights assistant that generates concise market updates for Indian farmers.
 
         Analyze the following query and contextual data to produce a structured summary of relevant agricultural market trends. Focus on commodity price forecasts, demand-supply patterns, policy impacts, and international trade developments. The tone should be neutral, informative, and suitable for display in an agricultural advisory app.
@@ -282,30 +418,125 @@ def govt_scheme_advisor_pipeline(query, farmer_state, top_k=5):
         {query}
 
         ### Contextual Market Data:
-        {context}
+        {context}{sections}
 
-        ### Farmer's Land Information:
-        {land_info}
+        Generate an **objective market trend update**, without directly addressing the user. Avoid conversational or second-person language.{instruction}
+        """.strip()
 
-        ### Financial Profile:
-        {financial_profile}
+def retrieval_recall_is_low(retrieved):
+    """True when fewer than `SCHEME_MIN_RETRIEVED_DOCUMENTS` pages came back or none scored `SCHEME_MIN_RETRIEVAL_SCORE`."""
+    if len(retrieved) < SCHEME_MIN_RETRIEVED_DOCUMENTS:
+        return True
+    scores = [doc["score"] for doc in retrieved if doc.get("score") is not None]
+    return bool(scores) and max(scores) < SCHEME_MIN_RETRIEVAL_SCORE
 
-        ### Government Schemes Enrolled:
-        {government_scheme_enrollments}
+async def aingest_live_results(query, farmer_id):
+    """
+    Live path: intents -> overlapped search + scrape -> dedupe/embed/store. Results
+    are stored without the farmer's state (new pages as central), since a page
+    found for one farmer is not specific to their state.
+    """
+    intents = (await aextract_intent_and_topic(query))["search_phrases"]
+    results = await search_and_scrape(intents)
+    filtered = [r for r in results if len(r["full_content"].strip()) > 20]
+    await asyncio.to_thread(ingest_scheme_documents, get_vector_store(), filtered, embed_texts, farmer_id)
 
-        Generate an **objective market trend update**, without directly addressing the user. Avoid conversational or second-person language.
-        **ans in 20 words**
-        """.strip()
+async def arun_scheme_pipeline(query, farmer_id, profile_sections=None, state=None, answer_instruction=None, top_k=5):
+    """
+    Async engine behind the scheme advisor entry points: retrieve from the scheme
+    vector store -> (live search + ingest, then retrieve again, per
+    `SCHEME_LIVE_SEARCH`) -> key-point extraction (one packed call, see
+    `extract_all_keypoints`) -> final answer.
+    With the offline corpus in place most queries never leave the retrieval
+    step. Blocking work (CSE calls, embedding, vector store I/O) runs in worker
+    threads; scraping uses the loop's long-lived aiohttp session and the LLM is
+    called with `ainvoke`.
+    """
+    retrieved = None
+    if SCHEME_LIVE_SEARCH != "always":
+        retrieved = await asyncio.to_thread(retrieve_scheme_documents, query, top_k, state)
+    if SCHEME_LIVE_SEARCH == "always" or (SCHEME_LIVE_SEARCH == "fallback" and retrieval_recall_is_low(retrieved)):
+        await aingest_live_results(query, farmer_id)
+        retrieved = await asyncio.to_thread(retrieve_scheme_documents, query, top_k, state)
 
-    # --- Generate Final Answer ---
-    retrieved = retrieve(query)
-    prompt = build_prompt(query, retrieved)
-    response = llm.invoke(prompt)
+    context = await extract_all_keypoints(retrieved[:5], query)
+    prompt = build_scheme_prompt(query, context, profile_sections, answer_instruction)
+    response = await llm.ainvoke(prompt)
 
     return {
         "query": query,
         "answer": response.content,
     }
+
+_scheme_loop = None
+_scheme_loop_lock = threading.Lock()
+
+def get_scheme_loop():
+    """
+    Long-lived event loop on a daemon thread that runs the async pipeline for
+    synchronous callers, so its aiohttp session is reused across calls instead of
+    being rebuilt by a fresh `asyncio.run` each time.
+    """
+    global _scheme_loop
+    if _scheme_loop is None:
+        with _scheme_loop_lock:
+            if _scheme_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="scheme-loop", daemon=True).start()
+                _scheme_loop = loop
+    return _scheme_loop
+
+def run_on_scheme_loop(coro):
+    loop = get_scheme_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("Await the async scheme pipeline instead of calling the sync adapter from its own loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def run_scheme_pipeline(*args, **kwargs):
+    """Sync adapter for `arun_scheme_pipeline` (used by the LangChain tool and thread-pool callers)."""
+    return run_on_scheme_loop(arun_scheme_pipeline(*args, **kwargs))
+
+def shutdown_scheme_loop():
+    """Closes the shared aiohttp session and stops the pipeline loop (app shutdown)."""
+    global _scheme_loop
+    with _scheme_loop_lock:
+        loop, _scheme_loop = _scheme_loop, None
+    if loop is not None:
+        asyncio.run_coroutine_threadsafe(close_async_session(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+def profile_pipeline_args(farmer_state):
+    farmer_profile = farmer_state.get("profile", {}).get("farmer_profile", {})
+    name = farmer_profile.get("name", "Unknown")
+    village = farmer_profile.get("location", {}).get("village", "Unknown")
+    return {
+        "farmer_id": f"{name}_{village}".replace(" ", "_"),
+        "profile_sections": {
+            "Farmer's Land Information": farmer_profile.get("land_info", {}),
+            "Financial Profile": farmer_profile.get("financial_profile", {}),
+            "Government Schemes Enrolled": farmer_profile.get("government_scheme_enrollments", {}),
+        },
+        "state": farmer_profile.get("location", {}).get("state"),
+        "answer_instruction": "**ans in 20 words**",
+    }
+
+async def agovt_scheme_advisor_pipeline_query(query, top_k=5):
+    return await arun_scheme_pipeline(query, farmer_id="abc", top_k=top_k)
+
+async def agovt_scheme_advisor_pipeline(query, farmer_state, top_k=5):
+    return await arun_scheme_pipeline(query, top_k=top_k, **profile_pipeline_args(farmer_state))
+
+def govt_scheme_advisor_pipeline_query(query, top_k=5):
+    return run_scheme_pipeline(query, farmer_id="abc", top_k=top_k)
+
+def govt_scheme_advisor_pipeline(query, farmer_state, top_k=5):
+    return run_scheme_pipeline(query, top_k=top_k, **profile_pipeline_args(farmer_state))
+
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 
@@ -328,12 +559,12 @@ def govt_scheme_advisor_pipeline_tool(query,name,village,land_info,financial_pro
     ------------------------------------------------------------------------------------
     ✅ FUNCTIONALITY:
     ------------------------------------------------------------------------------------
-    1. Extracts search intents from a farmer's query using intent detection.
-    2. Searches the web for related scheme documents using Google Search.
-    3. Scrapes content from result pages in batch.
-    4. Stores enriched documents (with embeddings) in a vector database.
-    5. Retrieves relevant scheme documents via vector similarity.
-    6. Uses an LLM to extract key points and generate an informative, structured summary based on:
+    1. Retrieves relevant scheme passages from a vector database kept filled by an
+       offline crawl of central and state scheme portals.
+    2. When retrieval is weak, extracts search intents from the query, searches the
+       web with Google Search, scrapes the result pages and stores them (with
+       embeddings) before retrieving again.
+    3. Uses an LLM to extract key points and generate an informative, structured summary based on:
        - Retrieved scheme content
        - Farmer’s land, financial, and enrollment profile
 
@@ -361,116 +592,17 @@ def govt_scheme_advisor_pipeline_tool(query,name,village,land_info,financial_pro
     - Make sure the query is specific enough for scheme matching to be useful.
     """
 
-    top_k=5
-    intent_data = extract_intent_and_topic(query)
-    intents = intent_data["search_phrases"]
     farmer_id = f"{name}_{village}".replace(" ", "_")
-
-    # --- Scraping and storing ---
-    all_scraped_metadata = []
-    for intent in intents:
-        all_scraped_metadata.extend(google_search(intent))
-
-    urls = [r["link"] for r in all_scraped_metadata]
-    full_texts = asyncio.run(batch_scrape(urls))
-
-    for meta, content in zip(all_scraped_metadata, full_texts):
-        meta["full_content"] = content
-        meta["source"] = "Google Search"
-        meta["scraped_at"] = datetime.utcnow().isoformat()
-
-    filtered = [r for r in all_scraped_metadata if len(r["full_content"].strip()) > 20]
-    texts = [r["full_content"] for r in filtered]
-    embeddings = embedding_model.encode(texts, batch_size=16, show_progress_bar=False, normalize_embeddings=True)
-    embeddings = [normalize(e) for e in embeddings]
-
-    for result, emb in zip(filtered, embeddings):
-        doc = {
-            **result,
-            "embedding": Vector(emb),
-            "farmer_id": farmer_id
-        }
-        vector_collection.add(doc)
-        print(f"Stored: {result['title'][:60]}")
-
-    # --- Vector Retrieval ---
-    def retrieve(query):
-        query_vec = normalize(embedding_model.encode(query))
-        docs = vector_collection.find_nearest(
-            vector_field="embedding",
-            query_vector=Vector(query_vec),
-            distance_measure=DistanceMeasure.DOT_PRODUCT,
-            limit=top_k
-        ).stream()
-
-        return [{
-            "title": d.get("title"),
-            "content": d.get("full_content"),
-            "source": d.get("source"),
-            "url": d.get("url")
-        } for d in (doc.to_dict() for doc in docs)]
-
-    # --- Extract Key Points with LLM ---
-    def extract_relevant_points(doc, query):
-        prompt = f"""
-        Given the following scheme description and a farmer's query, extract 10 key bullet points that are most relevant to the query.
-
-        Query:
-        {query}
-
-        Scheme Title:
-        {doc['title']}
-
-        Scheme Description:
-        {doc['content']}
-
-        Return only the key points in simple bullet format.
-        """.strip()
-        response = llm.invoke(prompt)
-        return response.content
-
-    def extract_all_keypoints(docs, query):
-        results = []
-        for doc in docs:
-            bullet_points = extract_relevant_points(doc, query)
-            formatted = f"\u2022 {doc['title']}:\n{bullet_points}"
-            results.append(formatted)
-        return "\n\n".join(results)
-
-    def build_prompt(query, context_docs, max_docs=5):
-        context = extract_all_keypoints(context_docs[:max_docs], query)
-        return f"""
-        You are an agricultural insights assistant that generates concise market updates for Indian farmers.
-
-        Analyze the following query and contextual data to produce a structured summary of relevant agricultural market trends. Focus on commodity price forecasts, demand-supply patterns, policy impacts, and international trade developments. The tone should be neutral, informative, and suitable for display in an agricultural advisory app.
-
-        ### User Query:
-        {query}
-
-        ### Contextual Market Data:
-        {context}
-
-        ### Farmer's Land Information:
-        {land_info}
-
-        ### Financial Profile:
-        {financial_profile}
-
-        ### Government Schemes Enrolled:
-        {government_scheme_enrollments}
-
-        Generate an **objective market trend update**, without directly addressing the user. Avoid conversational or second-person language.
-        """.strip()
-
-    # --- Generate Final Answer ---
-    retrieved = retrieve(query)
-    prompt = build_prompt(query, retrieved)
-    response = llm.invoke(prompt)
-
-    return {
-        "query": query,
-        "answer": response.content,
-    }
+    return run_scheme_pipeline(
+        query,
+        farmer_id,
+        profile_sections={
+            "Farmer's Land Information": land_info,
+            "Financial Profile": financial_profile,
+            "Government Schemes Enrolled": government_scheme_enrollments,
+        },
+        top_k=5,
+    )
 
 # import nest_asyncio
 # import asyncio
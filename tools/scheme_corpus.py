@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from tools.http_client import async_http_get, get_host_semaphore
+from tools.scheme_store import CENTRAL_SCHEME_STATE, content_hash, ingest_scheme_documents, normalize_url
+from tools.scrape_cache import SCRAPE_MAX_PER_HOST
+from tools.scheme_advisor import (
+    async_scrape,
+    embed_texts,
+    extract_paragraph_text,
+    get_vector_store,
+    run_on_scheme_loop,
+    shutdown_scheme_loop,
+)
+
+load_dotenv()
+# Optional JSON list of {"url": ..., "state": ...} replacing SCHEME_SEED_PORTALS.
+SCHEME_SEED_FILE = os.getenv("SCHEME_SEED_FILE")
+SCHEME_CORPUS_MAX_PAGES_PER_SEED = int(os.getenv("SCHEME_CORPUS_MAX_PAGES_PER_SEED", "25"))
+
+# Central portals (state None) are stored as CENTRAL_SCHEME_STATE and retrieved for every
+# farmer; state portals only for farmers in that state.
+SCHEME_SEED_PORTALS = [
+    {"url": "https://pmkisan.gov.in/", "state": None},
+    {"url": "https://pmfby.gov.in/", "state": None},
+    {"url": "https://pmksy.gov.in/", "state": None},
+    {"url": "https://pmkmy.gov.in/", "state": None},
+    {"url": "https://agriwelfare.gov.in/", "state": None},
+    {"url": "https://agriinfra.dac.gov.in/", "state": None},
+    {"url": "https://soilhealth.dac.gov.in/", "state": None},
+    {"url": "https://midh.gov.in/", "state": None},
+    {"url": "https://nfsm.gov.in/", "state": None},
+    {"url": "https://enam.gov.in/web/", "state": None},
+    {"url": "https://krishi.maharashtra.gov.in/", "state": "Maharashtra"},
+    {"url": "https://raitamitra.karnataka.gov.in/", "state": "Karnataka"},
+    {"url": "https://www.tnagrisnet.tn.gov.in/", "state": "Tamil Nadu"},
+    {"url": "https://agri.punjab.gov.in/", "state": "Punjab"},
+    {"url": "https://agriculture.rajasthan.gov.in/", "state": "Rajasthan"},
+    {"url": "https://mpkrishi.mp.gov.in/", "state": "Madhya Pradesh"},
+    {"url": "https://agri.telangana.gov.in/", "state": "Telangana"},
+    {"url": "https://www.apagrisnet.gov.in/", "state": "Andhra Pradesh"},
+    {"url": "https://agriculture.up.gov.in/", "state": "Uttar Pradesh"},
+    {"url": "https://ikhedut.gujarat.gov.in/", "state": "Gujarat"},
+]
+
+# Links on a portal are followed only when their text or URL mentions one of these.
+SCHEME_LINK_KEYWORDS = (
+    "scheme", "yojana", "subsidy", "guideline", "benefit", "eligib", "insurance",
+    "loan", "credit", "mission", "assistance", "apply", "pension", "incentive",
+)
+
+
+def load_seed_portals(path=SCHEME_SEED_FILE):
+    if not path:
+        return SCHEME_SEED_PORTALS
+    with open(path) as f:
+        return json.load(f)
+
+
+def scheme_links(html, base_url, limit=SCHEME_CORPUS_MAX_PAGES_PER_SEED):
+    """`(title, url)` of same-host links on a portal page that look scheme-related, in page order."""
+    soup = BeautifulSoup(html, "html.parser")
+    host = urlsplit(base_url).netloc.lower()
+    links, seen = [], {normalize_url(base_url)}
+    for anchor in soup.find_all("a", href=True):
+        url = urljoin(base_url, anchor["href"])
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.netloc.lower() != host:
+            continue
+        text = anchor.get_text(" ", strip=True)
+        if not any(keyword in f"{text} {url}".lower() for keyword in SCHEME_LINK_KEYWORDS):
+            continue
+        key = normalize_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        links.append((text or url, url))
+        if len(links) == limit:
+            break
+    return links
+
+
+def parse_portal_page(html, url):
+    """`(title, paragraph text, scheme links)` of a portal page."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else url
+    return title, extract_paragraph_text(html), scheme_links(html, url)
+
+
+async def crawl_portal(seed):
+    """
+    The seed page plus its scheme-related same-host links (one level deep), as
+    search-result-shaped dicts with `full_content`. Linked pages go through
+    `async_scrape`, so unchanged pages are revalidated rather than re-downloaded.
+    """
+    url = seed["url"]
+    try:
+        async with get_host_semaphore(url, SCRAPE_MAX_PER_HOST):
+            res = await async_http_get(url, timeout=15, retries=1, headers={"User-Agent": "Mozilla/5.0"})
+    except Exception as e:
+        print(f"Failed to crawl {url}: {e}")
+        return []
+    if res.status_code != 200:
+        print(f"Failed to crawl {url}: HTTP {res.status_code}")
+        return []
+
+    title, text, links = await asyncio.to_thread(parse_portal_page, res.text, url)
+    pages = [{"title": title, "link": url, "full_content": text}]
+    texts = await asyncio.gather(*(async_scrape(link) for _, link in links))
+    pages.extend({"title": text_title, "link": link, "full_content": text} for (text_title, link), text in zip(links, texts))
+
+    scraped_at = datetime.utcnow().isoformat()
+    for page in pages:
+        page.update({"snippet": "", "source": "Scheme portal", "scraped_at": scraped_at, "state": seed.get("state")})
+    return pages
+
+
+async def acrawl_scheme_corpus(seeds):
+    """Crawls every seed concurrently and drops failed, near-empty and byte-identical pages."""
+    crawled = await asyncio.gather(*(crawl_portal(seed) for seed in seeds))
+    pages, seen = [], set()
+    for page in (page for portal in crawled for page in portal):
+        text = page["full_content"].strip()
+        if len(text) <= 20 or text.startswith("[Error scraping"):
+            continue
+        digest = content_hash(text)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        pages.append(page)
+    return pages
+
+
+def ingest_scheme_corpus(seeds=None):
+    """
+    One offline ingestion pass over the seed portals: crawl, extract, chunk,
+    dedupe, embed and index into the scheme vector store. Pages are stored
+    without a farmer ID. Returns `(pages_crawled, pages_embedded)`.
+
+    Run as a separate process (`python -m tools.scheme_corpus`). With
+    `VECTOR_STORE_BACKEND=local` it must see the servers' `VECTOR_STORE_DIR` and
+    `EMBEDDING_CACHE_DIR` on the same host or volume: writes from every process
+    are serialized by file locks, and servers reload the store on their next
+    search. Servers on other machines only see its results through Firestore.
+    """
+    pages = run_on_scheme_loop(acrawl_scheme_corpus(seeds or load_seed_portals()))
+    by_state = defaultdict(list)
+    for page in pages:
+        by_state[page.pop("state") or CENTRAL_SCHEME_STATE].append(page)
+    embedded = sum(
+        ingest_scheme_documents(get_vector_store(), state_pages, embed_texts, farmer_id=None, state=state)
+        for state, state_pages in by_state.items()
+    )
+    return len(pages), embedded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the scheme seed portals into the scheme vector store.")
+    parser.add_argument("--seeds", default=SCHEME_SEED_FILE, help="JSON list of {url, state} seed portals")
+    parser.add_argument("--every-hours", type=float, help="Repeat the ingestion on this interval instead of running once")
+    args = parser.parse_args()
+
+    try:
+        while True:
+            started = time.time()
+            try:
+                crawled, embedded = ingest_scheme_corpus(load_seed_portals(args.seeds))
+                print(f"Scheme corpus ingested ({crawled} pages crawled, {embedded} embedded, {datetime.now().isoformat()})")
+            except Exception as e:
+                if not args.every_hours:
+                    raise
+                print(f"Scheme corpus ingestion failed: {e}")
+            if not args.every_hours:
+                break
+            time.sleep(max(0.0, args.every_hours * 3600 - (time.time() - started)))
+    finally:
+        shutdown_scheme_loop()
@@ -0,0 +1,185 @@
+import os
+import re
+import hashlib
+import argparse
+from urllib.parse import urlsplit, urlunsplit
+from google.cloud import firestore
+from dotenv import load_dotenv
+from tools.text_chunker import batched, chunk_text
+
+load_dotenv()
+SCHEME_COLLECTION = os.getenv("SCHEME_COLLECTION", "government_schemes")
+# Firestore rejects batches with more than 500 writes.
+FIRESTORE_MAX_BATCH_WRITES = 500
+# `state` of documents from central (all-India) scheme portals, retrieved alongside any state.
+CENTRAL_SCHEME_STATE = "Central"
+# Passages embedded and written per round trip during ingestion.
+SCHEME_EMBED_BATCH_SIZE = int(os.getenv("SCHEME_EMBED_BATCH_SIZE", "64"))
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def normalize_content(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def document_id(url):
+    """Stable Firestore document ID for a scraped page: SHA-256 of its normalized URL."""
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def commit_in_batches(client, operations):
+    """Applies `(method, ref, *args)` write operations in Firestore batches."""
+    for start in range(0, len(operations), FIRESTORE_MAX_BATCH_WRITES):
+        batch = client.batch()
+        for method, ref, *args in operations[start:start + FIRESTORE_MAX_BATCH_WRITES]:
+            getattr(batch, method)(ref, *args)
+        batch.commit()
+
+
+def passage_id(doc_id, index):
+    return f"{doc_id}-{index}"
+
+
+def ingest_scheme_documents(store, results, embed_texts, farmer_id, state=None, batch_size=SCHEME_EMBED_BATCH_SIZE):
+    """
+    Upserts scraped scheme pages into a `tools.vector_store` store as overlapping
+    passages (`tools.text_chunker.chunk_text`), one item per passage under
+    `passage_id(document_id(url), i)`. Passage 0 carries the page's content hash
+    and passage count, written only after every passage and stale delete has
+    been committed; an interrupted run leaves passage 0 without the new hash
+    (and with the highest passage count written), so the next run redoes the
+    page and cleans up after it.
+
+    Pages are tagged with `state`: corpus ingestion passes its portal's state (or
+    `CENTRAL_SCHEME_STATE`) and overrides any stored one, while live search passes
+    None, which keeps a page's stored state and stores new pages as central.
+
+    Pages whose normalized content hash matches the stored one are not re-embedded
+    or rewritten; at most `farmer_id` is added to their passages' `farmer_ids`
+    (offline corpus ingestion passes None) and their `state` is updated.
+    Passages of changed and new pages are streamed to `embed_texts(texts)` and
+    `upsert` in batches of `batch_size`; passages a shorter new version no longer
+    has, and any whole-page item from before chunking, are deleted. Returns the
+    number of pages (re-)embedded.
+    """
+    pages = {}
+    for result in results:
+        pages[document_id(result["link"])] = result
+    existing = store.get_metadata([passage_id(doc_id, 0) for doc_id in pages])
+
+    changed, items = [], []
+    for doc_id, result in pages.items():
+        digest = content_hash(result["full_content"])
+        stored = existing.get(passage_id(doc_id, 0)) or {}
+        page_state = state or stored.get("state") or CENTRAL_SCHEME_STATE
+        if stored.get("content_hash") != digest:
+            changed.append((doc_id, result, digest, stored.get("passage_count", 0), page_state))
+        else:
+            update = {}
+            if farmer_id and farmer_id not in (stored.get("farmer_ids") or []):
+                update["farmer_ids"] = [farmer_id]
+            if page_state != stored.get("state"):
+                update["state"] = page_state
+            if update:
+                items.extend((passage_id(doc_id, i), None, dict(update)) for i in range(stored.get("passage_count", 1)))
+    store.upsert(items)
+
+    stale, committed = [], []
+
+    def passages():
+        for doc_id, result, digest, stored_count, page_state in changed:
+            texts = chunk_text(result["full_content"])
+            stale.append(doc_id)
+            stale.extend(passage_id(doc_id, i) for i in range(len(texts), stored_count))
+            page = {key: value for key, value in result.items() if key != "full_content"}
+            for index, text in enumerate(texts):
+                metadata = {
+                    **page,
+                    "url": result["link"],
+                    "parent_id": doc_id,
+                    "passage_index": index,
+                    "passage_count": len(texts),
+                    "passage": text,
+                    "content_hash": digest,
+                    "farmer_id": farmer_id,
+                    "farmer_ids": [farmer_id] if farmer_id else [],
+                    "state": page_state,
+                }
+                if index == 0:
+                    metadata["content_hash"] = None
+                    metadata["passage_count"] = max(stored_count, len(texts))
+                yield passage_id(doc_id, index), text, metadata
+            committed.append((passage_id(doc_id, 0), None, {"content_hash": digest, "passage_count": len(texts)}))
+            print(f"Stored: {result['title'][:60]} ({len(texts)} passages)")
+
+    for batch in batched(passages(), batch_size):
+        embeddings = embed_texts([text for _, text, _ in batch])
+        store.upsert([(pid, emb, metadata) for (pid, _, metadata), emb in zip(batch, embeddings)])
+    store.delete(stale)
+    store.upsert(committed)
+    return len(changed)
+
+
+def compact_collection(client, collection=SCHEME_COLLECTION):
+    """
+    Collapses legacy duplicates (auto-ID documents from repeated `add` calls) into
+    one document per URL under its hashed ID, keeping the most recently scraped
+    copy and the union of farmer IDs. Passage documents are left alone. Returns
+    `(kept, deleted)` counts.
+    """
+    col = client.collection(collection)
+    groups = {}
+    for snapshot in col.stream():
+        data = snapshot.to_dict()
+        if data.get("parent_id"):
+            continue
+        url = data.get("url") or data.get("link")
+        if url:
+            groups.setdefault(document_id(url), []).append((snapshot, data))
+
+    operations, deleted = [], 0
+    for doc_id, copies in groups.items():
+        copies.sort(key=lambda copy: copy[1].get("scraped_at") or "", reverse=True)
+        newest = copies[0][1]
+        farmer_ids = sorted({
+            farmer
+            for _, data in copies
+            for farmer in (data.get("farmer_ids") or [data.get("farmer_id")])
+            if farmer
+        })
+        if len(copies) == 1 and copies[0][0].id == doc_id and newest.get("content_hash"):
+            continue
+        url = newest.get("url") or newest.get("link")
+        operations.append(("set", col.document(doc_id), {
+            **newest,
+            "url": url,
+            "content_hash": content_hash(newest.get("full_content") or ""),
+            "farmer_ids": farmer_ids,
+        }))
+        for snapshot, _ in copies:
+            if snapshot.id != doc_id:
+                operations.append(("delete", snapshot.reference))
+                deleted += 1
+
+    commit_in_batches(client, operations)
+    return len(groups), deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the government scheme vector collection.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subcommands.add_parser("compact", help="Remove duplicate scheme documents")
+    compact_parser.add_argument("--collection", default=SCHEME_COLLECTION)
+    args = parser.parse_args()
+
+    kept, deleted = compact_collection(firestore.Client(), args.collection)
+    print(f"Compacted {args.collection}: {kept} documents kept, {deleted} duplicates removed")
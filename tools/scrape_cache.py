@@ -0,0 +1,117 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from dotenv import load_dotenv
+from tools.scheme_store import normalize_url
+
+load_dotenv()
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", os.path.join("data", "scrape_cache.sqlite"))
+# Pages younger than this are served without touching the network; older ones are revalidated.
+SCRAPE_CACHE_TTL_SECONDS = float(os.getenv("SCRAPE_CACHE_TTL_SECONDS", str(24 * 3600)))
+SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", "5000"))
+# Concurrent requests allowed to any one host during a batch scrape.
+SCRAPE_MAX_PER_HOST = int(os.getenv("SCRAPE_MAX_PER_HOST", "4"))
+
+
+class ScrapeCache:
+    """
+    URL-keyed cache of extracted page text with the validators (ETag /
+    Last-Modified) needed for conditional revalidation. Bounded to `max_entries`
+    rows on disk, evicting the least recently used.
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, ttl=SCRAPE_CACHE_TTL_SECONDS, max_entries=SCRAPE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, "
+                "last_modified TEXT, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, url):
+        """`{"text", "etag", "last_modified", "fetched_at"}` for `url`, or None."""
+        key = normalize_url(url)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT text, etag, last_modified, fetched_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), key))
+            conn.commit()
+        return {"text": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] <= self.ttl
+
+    def set(self, url, text, etag=None, last_modified=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), text, etag, last_modified, now, now),
+            )
+            conn.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def mark_revalidated(self, url):
+        """Restarts the TTL of an entry the server confirmed unchanged (304)."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, normalize_url(url)))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM pages")
+            conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "lookups": lookups,
+            "fresh_hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+        }
+
+
+scrape_cache = ScrapeCache()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local scheme scrape cache.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("clear", help="Drop every cached page")
+    args = parser.parse_args()
+
+    scrape_cache.clear()
+    print("Cleared the scrape cache")
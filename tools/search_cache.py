@@ -0,0 +1,74 @@
+import os
+import re
+import time
+from dotenv import load_dotenv
+from tools.local_cache import RefreshingCache, SqliteCache
+
+load_dotenv()
+CSE_CACHE_PATH = os.getenv("CSE_CACHE_PATH", os.path.join("data", "search_cache.sqlite"))
+CSE_CACHE_TTL_SECONDS = float(os.getenv("CSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Phrases whose normalized token sets overlap at least this much (Jaccard) share one API call.
+CSE_NEAR_DUPLICATE_JACCARD = float(os.getenv("CSE_NEAR_DUPLICATE_JACCARD", "0.8"))
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "the", "to", "what", "when", "where",
+    "which", "who", "with", "available", "get", "about", "under", "any", "there",
+}
+
+search_memory_cache = RefreshingCache(
+    ttl=CSE_CACHE_TTL_SECONDS, maxsize=2048, cacheable=lambda value: value is not None, timestamped=True
+)
+search_disk_cache = SqliteCache(CSE_CACHE_PATH, table="cse_results")
+
+
+def query_tokens(query):
+    words = re.findall(r"[^\W_]+", query.lower())
+    return sorted({word for word in words if word not in STOP_WORDS}) or sorted(set(words))
+
+
+def normalize_query(query):
+    """Cache key for a search phrase: lowercased, stop words dropped, unique tokens sorted."""
+    return " ".join(query_tokens(query))
+
+
+def collapse_near_duplicates(phrases, threshold=CSE_NEAR_DUPLICATE_JACCARD):
+    """
+    Keeps the first phrase of each group whose normalized token sets are identical
+    or at least `threshold` similar (Jaccard), preserving order.
+    """
+    kept, kept_tokens = [], []
+    for phrase in phrases:
+        tokens = set(query_tokens(phrase))
+        if any(
+            tokens == other or (tokens | other and len(tokens & other) / len(tokens | other) >= threshold)
+            for other in kept_tokens
+        ):
+            continue
+        kept.append(phrase)
+        kept_tokens.append(tokens)
+    return kept
+
+
+def cached_search(query, fetch):
+    """
+    `fetch(query)` results for `query`, shared by every phrasing with the same
+    normalized key. Concurrent misses coalesce into one call; results persist in
+    SQLite for `CSE_CACHE_TTL_SECONDS`, and a disk hit is kept in memory only for
+    the rest of that TTL. Exceptions from `fetch` are not cached.
+    """
+    key = normalize_query(query)
+
+    def load():
+        entry = search_disk_cache.get_entry(key)
+        if entry is not None and entry[1] is not None and time.time() - entry[0] <= CSE_CACHE_TTL_SECONDS:
+            return entry
+        results = fetch(query)
+        search_disk_cache.set(key, results)
+        return time.time(), results
+
+    return search_memory_cache.get_or_load(key, load)
+
+
+def get_search_cache_stats():
+    return search_memory_cache.stats()
@@ -0,0 +1,113 @@
+import os
+import math
+import json
+import struct
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from tools.local_cache import TieredCache
+
+load_dotenv()
+SOIL_CACHE_PATH = os.getenv("SOIL_CACHE_PATH", os.path.join("data", "soil_cache.sqlite"))
+# SoilGrids is published on a 250 m grid; 7.5 arc-seconds (1/480 degree, ~230 m) is the
+# closest regular lat/lon grid, so one cache cell covers about one SoilGrids cell.
+SOILGRIDS_CELL_DEG = float(os.getenv("SOILGRIDS_CELL_DEG", str(1 / 480)))
+SOILGRIDS_DEPTHS = ["0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"]
+
+soil_property_cache = TieredCache(SOIL_CACHE_PATH, table="soilgrids", maxsize=2048, raw=True)
+
+
+def soil_cell_key(lat, lon, cell_deg=SOILGRIDS_CELL_DEG):
+    return f"{math.floor(float(lat) / cell_deg)}:{math.floor(float(lon) / cell_deg)}"
+
+
+class SoilProfileCodec:
+    """
+    Packs `extract_soil_properties` output into a compact binary blob.
+
+    Layout: b"B", a uint16 bitmask of the labels present, the units joined by
+    0x1f (uint16 length prefix), then a float64 (labels x depths) matrix with NaN
+    for "Missing". Profiles with non-standard depths fall back to b"J" + JSON.
+    """
+
+    def __init__(self, labels, depths=SOILGRIDS_DEPTHS):
+        self.labels = list(labels)
+        self.depths = list(depths)
+
+    def encode(self, soil_data):
+        standard = set(self.depths)
+        if set(soil_data) - set(self.labels) or any(set(d) != standard for d in soil_data.values()):
+            return b"J" + json.dumps(soil_data).encode("utf-8")
+
+        values = np.full((len(self.labels), len(self.depths)), np.nan, dtype=np.float64)
+        units = []
+        present = 0
+        for i, label in enumerate(self.labels):
+            depth_data = soil_data.get(label)
+            if depth_data is None:
+                units.append("")
+                continue
+            present |= 1 << i
+            units.append(next(iter(depth_data.values()))["unit"])
+            for j, depth in enumerate(self.depths):
+                value = depth_data[depth]["value"]
+                if value != "Missing":
+                    values[i, j] = value
+
+        unit_bytes = "\x1f".join(units).encode("utf-8")
+        return b"B" + struct.pack("<HH", present, len(unit_bytes)) + unit_bytes + values.tobytes()
+
+    def decode(self, blob):
+        blob = bytes(blob)
+        if blob[:1] == b"J":
+            return json.loads(blob[1:].decode("utf-8"))
+
+        present, unit_len = struct.unpack_from("<HH", blob, 1)
+        offset = 5 + unit_len
+        units = blob[5:offset].decode("utf-8").split("\x1f")
+        values = np.frombuffer(blob, dtype=np.float64, offset=offset).reshape(len(self.labels), len(self.depths))
+
+        result = {}
+        for i, label in enumerate(self.labels):
+            if not present & (1 << i):
+                continue
+            result[label] = {
+                depth: {
+                    "value": "Missing" if np.isnan(values[i, j]) else _as_number(values[i, j]),
+                    "unit": units[i],
+                }
+                for j, depth in enumerate(self.depths)
+            }
+        return result
+
+
+def _as_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def invalidate(lat=None, lon=None):
+    """Drops one cell (lat/lon given) or the whole SoilGrids cache."""
+    if lat is None or lon is None:
+        soil_property_cache.clear()
+    else:
+        soil_property_cache.delete(soil_cell_key(lat, lon))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local SoilGrids result cache.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    invalidate_parser = subcommands.add_parser("invalidate", help="Drop cached soil properties")
+    invalidate_parser.add_argument("--lat", type=float)
+    invalidate_parser.add_argument("--lon", type=float)
+    invalidate_parser.add_argument("--all", action="store_true", help="Drop every cached cell")
+    args = parser.parse_args()
+
+    if args.all:
+        invalidate()
+        print("Cleared the SoilGrids cache")
+    elif args.lat is not None and args.lon is not None:
+        invalidate(args.lat, args.lon)
+        print(f"Invalidated SoilGrids cell {soil_cell_key(args.lat, args.lon)}")
+    else:
+        parser.error("pass --lat and --lon, or --all")
@@ -1,15 +1,27 @@
-import requests
 from tools.weather_tool import get_location_coordinates
+from tools.http_client import http_get
+from tools.soil_cache import SoilProfileCodec, soil_cell_key, soil_property_cache
+from tools.soil_raster import SoilRasterBackend
+from tools.soil_narrative_cache import soil_narrative_cache
+from tools.soil_rules import rule_insights
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from llm_service.service import llm_3
 from langchain.output_parsers import PydanticOutputParser
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 GOV_API = os.getenv("GOV_API")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  
+# "soilgrids" (REST API, cached) or "raster" (local memory-mapped tiles, REST fallback)
+SOIL_BACKEND = os.getenv("SOIL_BACKEND", "soilgrids")
+SOIL_FETCH_CONCURRENCY = int(os.getenv("SOIL_FETCH_CONCURRENCY", "8"))
+SOIL_NARRATIVE_CONCURRENCY = int(os.getenv("SOIL_NARRATIVE_CONCURRENCY", "4"))
+# "hybrid" (rule-based analysis plus LLM crop/improvement advice) or "fast" (rules only, no LLM call)
+SOIL_INSIGHT_MODE = os.getenv("SOIL_INSIGHT_MODE", "hybrid")
 
 llm=llm_3
 class SoilInfoInput(BaseModel):
@@ -41,27 +53,28 @@ class RichSoilInsightOutput(BaseModel):
     recommended_crop_types: str = Field(..., description="Explanation of crops suitable for this soil based on its properties")
     soil_health_improvements: str = Field(..., description="Detailed suggestions for maintaining or improving soil health")
 
-def generate_soil_info(soil_data):
-    parser = PydanticOutputParser(pydantic_object=RichSoilInsightOutput)
+class SoilAdviceOutput(BaseModel):
+    recommended_crop_types: str = Field(..., description="Explanation of crops suitable for this soil based on its properties")
+    soil_health_improvements: str = Field(..., description="Detailed suggestions for maintaining or improving soil health")
+
+def request_soil_advice(findings):
+    parser = PydanticOutputParser(pydantic_object=SoilAdviceOutput)
     prompt=f"""
         You are a soil science and agronomy expert.
 
-        A farmer has provided detailed soil data in JSON format, representing values like bulk density, cation exchange capacity, clay/sand/silt composition, organic carbon, and soil pH across multiple depths.
+        A farmer's topsoil has already been classified as follows:
+        - Texture: {findings["soil_texture"] or "unknown"}. {findings["texture_implications"]}
+        - pH: {findings["ph_implications"]}
+        - Organic carbon: {findings["organic_carbon_analysis"]}
+        - Strengths: {findings["soil_strengths"]}
+        - Weaknesses: {findings["soil_weaknesses"]}
 
-        Your task is to analyze this data and provide a structured, paragraph-style analysis across the following categories:
+        Based on this classification, write:
 
-        1. **Soil Strengths**: Write a paragraph about what's good in this soil.
-        2. **Soil Weaknesses**: Paragraph describing key limitations or challenges.
-        3. **Texture Implications**: Paragraph explaining the role of sand/silt/clay distribution in water retention, aeration, and compaction.
-        4. **pH Implications**: Paragraph summarizing how pH values affect nutrient uptake, microbial activity, and crop suitability.
-        5. **Organic Carbon Analysis**: Write about the adequacy of organic matter and long-term soil fertility.
-        6. **Recommended Crop Types**: Based on the full soil profile, what crops are most suited?
-        7. **Soil Health Improvements**: What agronomic practices can maintain or improve this soil?
+        1. **Recommended Crop Types**: What crops are most suited to this soil, and why?
+        2. **Soil Health Improvements**: What agronomic practices can maintain or improve this soil?
 
-        Respond in clear, farmer-friendly language using one paragraph per point.
-        Soil Data:
-        ```json
-        {soil_data}
+        Respond in clear, farmer-friendly language using one paragraph per point. Do not quote exact measurements.
 
         ### Output Format (Structured)
         {parser.get_format_instructions()}
@@ -70,13 +83,37 @@ def generate_soil_info(soil_data):
     structured = parser.parse(raw_response.content)
     return structured
 
+def generate_soil_advice(soil_data, findings):
+    """
+    LLM crop and soil-health advice for `soil_data` given its `rule_insights` findings,
+    reused from `soil_narrative_cache` when a profile in the same (or a neighbouring)
+    quantized bin has been advised on before.
+    """
+    cached = soil_narrative_cache.lookup(soil_data)
+    if cached is not None:
+        return {field: cached[field] for field in SoilAdviceOutput.model_fields}
+    advice = request_soil_advice(findings).model_dump()
+    soil_narrative_cache.store(soil_data, advice)
+    return advice
+
+def generate_soil_info(soil_data, mode=None):
+    """
+    Soil insights for one profile. pH, texture and organic carbon analysis come from
+    the deterministic rules in `tools.soil_rules`; crop and improvement advice comes
+    from the LLM, or from the rules as well in "fast" mode.
+    """
+    findings = rule_insights([soil_data])[0]
+    if (mode or SOIL_INSIGHT_MODE) != "fast":
+        findings.update(generate_soil_advice(soil_data, findings))
+    return RichSoilInsightOutput(**findings)
+
 def get_soilgrid_data(lat: float, lon: float):
     url = "https://rest.isric.org/soilgrids/v2.0/properties/query"
     params = {
         "lat": lat,
         "lon": lon
     }
-    response = requests.get(url, params=params)
+    response = http_get(url, params=params)
     response.raise_for_status()
     return response.json()
 
@@ -110,6 +147,123 @@ def extract_soil_properties(response):
 
     return result
 
+soil_profile_codec = SoilProfileCodec(ESSENTIAL_PROPERTIES.values())
+
+def get_soilgrid_properties(lat: float, lon: float):
+    """
+    `extract_soil_properties(get_soilgrid_data(lat, lon))`, served from the permanent
+    SoilGrids cache keyed by the raster cell containing the coordinate.
+    """
+    key = soil_cell_key(lat, lon)
+    blob = soil_property_cache.get(key)
+    if blob is not None:
+        return soil_profile_codec.decode(blob)
+
+    soil_data = extract_soil_properties(get_soilgrid_data(lat, lon))
+    soil_property_cache.set(key, soil_profile_codec.encode(soil_data))
+    return soil_data
+
+_soil_raster = None
+_soil_raster_lock = threading.Lock()
+
+def get_soil_raster():
+    """The offline raster backend when `SOIL_BACKEND=raster` and the tiles are present, else None."""
+    global _soil_raster
+    if SOIL_BACKEND != "raster":
+        return None
+    with _soil_raster_lock:
+        if _soil_raster is None:
+            try:
+                _soil_raster = SoilRasterBackend(properties=ESSENTIAL_PROPERTIES)
+            except Exception as e:
+                print("Soil raster backend unavailable:", e)
+                return None
+        return _soil_raster
+
+def get_soil_properties_batch(points):
+    """
+    Depth-wise soil properties for many (lat, lon) points. With the raster backend,
+    all points are looked up locally in one pass and only points outside its
+    coverage go to SoilGrids.
+    """
+    raster = get_soil_raster()
+    results = raster.lookup_many(points) if raster is not None else [None] * len(points)
+    remote = [i for i, soil_data in enumerate(results) if soil_data is None]
+    if len(remote) == 1:
+        results[remote[0]] = get_soilgrid_properties(*points[remote[0]])
+    elif remote:
+        with ThreadPoolExecutor(max_workers=SOIL_FETCH_CONCURRENCY) as executor:
+            for i, soil_data in zip(remote, executor.map(lambda i: get_soilgrid_properties(*points[i]), remote)):
+                results[i] = soil_data
+    return results
+
+def get_soil_properties(lat: float, lon: float):
+    return get_soil_properties_batch([(lat, lon)])[0]
+
+def _soil_insights_by_cell(points, mode):
+    """
+    Core of the soil-insight engine: dedupes `points` by SoilGrids cell, fetches
+    raw properties for the unique cells in one batch, classifies them all in one
+    vectorized `rule_insights` pass and, outside "fast" mode, asks the LLM for crop
+    and improvement advice with at most `SOIL_NARRATIVE_CONCURRENCY` calls in flight.
+    Returns a list aligned with `points` of soil dicts or the exception raised for that cell.
+    """
+    cells = {}
+    for lat, lon in points:
+        cells.setdefault(soil_cell_key(lat, lon), (lat, lon))
+    keys = list(cells)
+
+    try:
+        raw = get_soil_properties_batch([cells[key] for key in keys])
+    except Exception:
+        # Fall back to per-cell fetches so one bad cell doesn't fail the whole batch.
+        raw = []
+        for key in keys:
+            try:
+                raw.append(get_soil_properties(*cells[key]))
+            except Exception as e:
+                raw.append(e)
+
+    fetched = [i for i, soil_data in enumerate(raw) if not isinstance(soil_data, Exception)]
+    findings = dict(zip(fetched, rule_insights([raw[i] for i in fetched])))
+
+    def enrich(i):
+        if i not in findings:
+            return raw[i]
+        result = {**raw[i], **findings[i]}
+        if mode != "fast":
+            try:
+                result.update(generate_soil_advice(raw[i], findings[i]))
+            except Exception as e:
+                return e
+        return result
+
+    if mode == "fast" or len(keys) == 1:
+        enriched = [enrich(i) for i in range(len(keys))]
+    else:
+        with ThreadPoolExecutor(max_workers=SOIL_NARRATIVE_CONCURRENCY) as executor:
+            enriched = list(executor.map(enrich, range(len(keys))))
+
+    by_cell = dict(zip(keys, enriched))
+    return [by_cell[soil_cell_key(lat, lon)] for lat, lon in points]
+
+def get_soil_insights_batch(points, mode=None):
+    """
+    Depth-wise soil data plus insights for many (lat, lon) points, e.g. for batch
+    alert or market-trend runs. Points in the same cell share one fetch and one
+    LLM call. `mode` defaults to `SOIL_INSIGHT_MODE`; "fast" skips the LLM entirely.
+    Failed points come back as {"error": "..."}.
+    """
+    return [
+        {"error": str(result)} if isinstance(result, Exception) else dict(result)
+        for result in _soil_insights_by_cell(points, mode or SOIL_INSIGHT_MODE)
+    ]
+
+def get_soil_insights(latitude: float, longitude: float, mode=None):
+    result = _soil_insights_by_cell([(latitude, longitude)], mode or SOIL_INSIGHT_MODE)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 def get_soil_info(farmer_state):
     """
@@ -135,8 +289,7 @@ def get_soil_info(farmer_state):
     farmer_profile = farmer_state.get("profile", {}).get("farmer_profile", {})
     state = farmer_profile.get("location", {}).get("state", "Unknown")
     latitude, longitude, place_name=get_location_coordinates(state=state)
-    response = get_soilgrid_data(latitude, longitude)
-    soil_data = extract_soil_properties(response)
+    soil_data = get_soil_properties(latitude, longitude)
     return soil_data
 
 def get_soil(latitude: float, longitude: float):
@@ -191,16 +344,7 @@ def get_soil(latitude: float, longitude: float):
     - Designed for integration in larger decision-support pipelines (e.g., crop advisory agents, soil health tools).
     - This tool bridges raw environmental data with AI-powered agronomic reasoning for practical, field-ready guidance.
     """
-    response = get_soilgrid_data(latitude, longitude)
-    soil_data = extract_soil_properties(response)
-    get_detail = generate_soil_info(soil_data)
-    soil_data["soil_strengths"] = get_detail.soil_strengths
-    soil_data["soil_weaknesses"] = get_detail.soil_weaknesses
-    soil_data["ph_implications"] = get_detail.ph_implications
-    soil_data["organic_carbon_analysis"] = get_detail.organic_carbon_analysis
-    soil_data["recommended_crop_types"] = get_detail.recommended_crop_types
-    soil_data["soil_health_improvements"] = get_detail.soil_health_improvements
-    return soil_data
+    return get_soil_insights(latitude, longitude)
 
 def get_soil_info_lati_longi(latitude: float, longitude: float):
     """
@@ -254,16 +398,7 @@ def get_soil_info_lati_longi(latitude: float, longitude: float):
     - Designed for integration in larger decision-support pipelines (e.g., crop advisory agents, soil health tools).
     - This tool bridges raw environmental data with AI-powered agronomic reasoning for practical, field-ready guidance.
     """
-    response = get_soilgrid_data(latitude, longitude)
-    soil_data = extract_soil_properties(response)
-    get_detail = generate_soil_info(soil_data)
-    soil_data["soil_strengths"] = get_detail.soil_strengths
-    soil_data["soil_weaknesses"] = get_detail.soil_weaknesses
-    soil_data["ph_implications"] = get_detail.ph_implications
-    soil_data["organic_carbon_analysis"] = get_detail.organic_carbon_analysis
-    soil_data["recommended_crop_types"] = get_detail.recommended_crop_types
-    soil_data["soil_health_improvements"] = get_detail.soil_health_improvements
-    return soil_data
+    return get_soil_insights(latitude, longitude)
 
 
 @tool(args_schema=SoilInfoInput)
@@ -319,16 +454,7 @@ def get_soil_info_lat_long(latitude: float, longitude: float):
     - Designed for integration in larger decision-support pipelines (e.g., crop advisory agents, soil health tools).
     - This tool bridges raw environmental data with AI-powered agronomic reasoning for practical, field-ready guidance.
     """
-    response = get_soilgrid_data(latitude, longitude)
-    soil_data = extract_soil_properties(response)
-    get_detail = generate_soil_info(soil_data)
-    soil_data["soil_strengths"] = get_detail.soil_strengths
-    soil_data["soil_weaknesses"] = get_detail.soil_weaknesses
-    soil_data["ph_implications"] = get_detail.ph_implications
-    soil_data["organic_carbon_analysis"] = get_detail.organic_carbon_analysis
-    soil_data["recommended_crop_types"] = get_detail.recommended_crop_types
-    soil_data["soil_health_improvements"] = get_detail.soil_health_improvements
-    return soil_data
+    return get_soil_insights(latitude, longitude)
 
 @tool(args_schema=SoilLocationInput)
 def get_soil_info_by_location(state: str, district: Optional[str] = None, village: Optional[str] = None):
@@ -386,14 +512,6 @@ def get_soil_info_by_location(state: str, district: Optional[str] = None, villag
     Requires a valid Google Maps API key to perform geocoding.
     """
     lat, lng, location_name = get_location_coordinates(state, district, village)
-    soil_data = get_soil(lat, lng)
+    soil_data = get_soil_insights(lat, lng)
     soil_data["location_name"] = location_name
-    get_detail = generate_soil_info(soil_data)
-    print(get_detail)
-    soil_data["soil_strengths"] = get_detail.soil_strengths
-    soil_data["soil_weaknesses"] = get_detail.soil_weaknesses
-    soil_data["ph_implications"] = get_detail.ph_implications
-    soil_data["organic_carbon_analysis"] = get_detail.organic_carbon_analysis
-    soil_data["recommended_crop_types"] = get_detail.recommended_crop_types
-    soil_data["soil_health_improvements"] = get_detail.soil_health_improvements
     return soil_data
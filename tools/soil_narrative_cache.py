@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from tools.local_cache import SqliteCache
+from tools.soil_rules import PH_BIN_WIDTH, classify_profiles
+
+load_dotenv()
+SOIL_NARRATIVE_CACHE_PATH = os.getenv("SOIL_NARRATIVE_CACHE_PATH", os.path.join("data", "soil_narratives.sqlite"))
+SOIL_NARRATIVE_CACHE_SIZE = int(os.getenv("SOIL_NARRATIVE_CACHE_SIZE", "4096"))
+# Largest per-component bin difference still accepted as a nearest-neighbour hit; 0 disables the fallback.
+SOIL_NARRATIVE_MAX_BIN_DISTANCE = int(os.getenv("SOIL_NARRATIVE_MAX_BIN_DISTANCE", "1"))
+
+
+def quantize_profiles(profiles):
+    """
+    (profiles x 4) int array of (pH bin, USDA texture class, SOC band, CEC band) from
+    the topsoil means, with -1 for components that have no data.
+    """
+    c = classify_profiles(profiles)
+    ph = c["ph"]
+    ph_bins = np.where(np.isnan(ph), -1, np.floor(np.nan_to_num(ph) / PH_BIN_WIDTH))
+    return np.stack([ph_bins, c["texture_class"], c["soc_band"], c["cec_band"]], axis=1).astype(np.int64)
+
+
+def profile_key(vector):
+    return ":".join(str(int(v)) for v in vector)
+
+
+class SoilNarrativeCache:
+    """
+    Cache of LLM soil advice (`generate_soil_advice` output) keyed on a quantized
+    soil profile.
+
+    Exact bin hits are served first. Otherwise the closest cached profile with the
+    same texture class is used if every other component is within
+    `max_distance` bins. The in-process index is an LRU of `maxsize` entries,
+    warmed from (and written through to) a local SQLite table.
+    """
+
+    def __init__(self, path=SOIL_NARRATIVE_CACHE_PATH, maxsize=SOIL_NARRATIVE_CACHE_SIZE,
+                 max_distance=SOIL_NARRATIVE_MAX_BIN_DISTANCE):
+        self.disk = SqliteCache(path, table="soil_narratives")
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._warmed = False
+        self.exact_hits = 0
+        self.nearest_hits = 0
+        self.misses = 0
+
+    def _warm(self):
+        if self._warmed:
+            return
+        self._warmed = True
+        try:
+            rows = self.disk.items(limit=self.maxsize)
+        except Exception as e:
+            print("Soil narrative cache unavailable:", e)
+            return
+        for key, value in reversed(rows):
+            self._entries[key] = value
+
+    def _nearest(self, vector):
+        if self.max_distance <= 0 or not self._entries:
+            return None
+        keys = list(self._entries)
+        vectors = np.array([[int(v) for v in key.split(":")] for key in keys], dtype=np.int64)
+        same_texture = vectors[:, 1] == vector[1]
+        diffs = np.abs(vectors[:, [0, 2, 3]] - vector[[0, 2, 3]])
+        within = same_texture & (diffs.max(axis=1) <= self.max_distance)
+        if not within.any():
+            return None
+        distance = np.where(within, diffs.sum(axis=1), np.iinfo(np.int64).max)
+        return keys[int(np.argmin(distance))]
+
+    def lookup(self, soil_data):
+        """Cached narrative dict for `soil_data`, or None."""
+        vector = quantize_profiles([soil_data])[0]
+        if vector[1] < 0:
+            # Without texture the profile is too incomplete to share a narrative.
+            self.misses += 1
+            return None
+        key = profile_key(vector)
+        with self._lock:
+            self._warm()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key]
+            nearest = self._nearest(vector)
+            if nearest is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(nearest)
+            self.nearest_hits += 1
+            return self._entries[nearest]
+
+    def store(self, soil_data, narrative):
+        vector = quantize_profiles([soil_data])[0]
+        if vector[1] < 0:
+            return
+        key = profile_key(vector)
+        with self._lock:
+            self._warm()
+            self._entries[key] = narrative
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        try:
+            self.disk.set(key, narrative)
+        except Exception as e:
+            print("Failed to persist soil narrative:", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._warmed = True
+        self.disk.clear()
+
+    def stats(self):
+        lookups = self.exact_hits + self.nearest_hits + self.misses
+        return {
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "nearest_hits": self.nearest_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.nearest_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+soil_narrative_cache = SoilNarrativeCache()
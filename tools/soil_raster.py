@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+SOIL_RASTER_DIR = os.getenv("SOIL_RASTER_DIR", os.path.join("data", "soilgrids_india"))
+
+
+class SoilRasterBackend:
+    """
+    Offline SoilGrids backend reading pre-extracted layers from memory-mapped tiles.
+
+    Directory layout under `root`:
+        manifest.json                      cell_deg, tile_deg, nodata, depths and
+                                           {property_code: {"unit": target_units}}
+        {property}/{depth}/{ti}_{tj}.npy   int16 tile for lat in [ti, ti+1) * tile_deg and
+                                           lon in [tj, tj+1) * tile_deg, row 0 at the
+                                           north edge, column 0 at the west edge
+
+    Values are the SoilGrids mapped-unit integers, i.e. the same `mean` the REST API
+    returns, so results match `extract_soil_properties` output.
+    """
+
+    def __init__(self, root=SOIL_RASTER_DIR, properties=None):
+        with open(os.path.join(root, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.root = root
+        self.cell_deg = float(manifest["cell_deg"])
+        self.tile_deg = float(manifest["tile_deg"])
+        self.nodata = int(manifest.get("nodata", -32768))
+        self.depths = list(manifest["depths"])
+        self.units = {code: spec["unit"] for code, spec in manifest["properties"].items()}
+        # property code -> output label, e.g. {"phh2o": "Soil pH"}
+        labels = properties or {code: code for code in self.units}
+        self.properties = [(code, labels[code]) for code in self.units if code in labels]
+        self.tile_cells = int(round(self.tile_deg / self.cell_deg))
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def _tile(self, code, depth, ti, tj):
+        key = (code, depth, ti, tj)
+        with self._lock:
+            if key not in self._tiles:
+                path = os.path.join(self.root, code, depth, f"{ti}_{tj}.npy")
+                self._tiles[key] = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+            return self._tiles[key]
+
+    def lookup_values(self, lats, lons):
+        """
+        Raw (points x properties x depths) int array for many points, with `nodata`
+        where no tile or value exists.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        ti = np.floor(lats / self.tile_deg).astype(np.int64)
+        tj = np.floor(lons / self.tile_deg).astype(np.int64)
+        last = self.tile_cells - 1
+        rows = np.clip(np.floor(((ti + 1) * self.tile_deg - lats) / self.cell_deg), 0, last).astype(np.int64)
+        cols = np.clip(np.floor((lons - tj * self.tile_deg) / self.cell_deg), 0, last).astype(np.int64)
+
+        values = np.full((len(lats), len(self.properties), len(self.depths)), self.nodata, dtype=np.int32)
+        tiles = np.stack([ti, tj], axis=1)
+        for tile_i, tile_j in np.unique(tiles, axis=0):
+            in_tile = np.flatnonzero((ti == tile_i) & (tj == tile_j))
+            for p, (code, _) in enumerate(self.properties):
+                for d, depth in enumerate(self.depths):
+                    tile = self._tile(code, depth, int(tile_i), int(tile_j))
+                    if tile is not None:
+                        values[in_tile, p, d] = tile[rows[in_tile], cols[in_tile]]
+        return values
+
+    def lookup_many(self, points):
+        """
+        Soil property dicts (same shape as `extract_soil_properties`) for a list of
+        (lat, lon) points; None for points outside the extracted coverage.
+        """
+        if not points:
+            return []
+        lats, lons = zip(*points)
+        values = self.lookup_values(lats, lons)
+
+        results = []
+        for point_values in values:
+            if np.all(point_values == self.nodata):
+                results.append(None)
+                continue
+            result = {}
+            for p, (code, label) in enumerate(self.properties):
+                result[label] = {
+                    depth: {
+                        "value": "Missing" if point_values[p, d] == self.nodata else int(point_values[p, d]),
+                        "unit": self.units[code],
+                    }
+                    for d, depth in enumerate(self.depths)
+                }
+            results.append(result)
+        return results
+
+    def lookup(self, lat, lon):
+        return self.lookup_many([(lat, lon)])[0]
+
+
+def write_manifest(root, properties, depths, cell_deg, tile_deg=1.0, nodata=-32768):
+    """
+    Writes the manifest for an extracted raster set. `properties` maps each
+    SoilGrids property code to the unit label to report (`target_units`).
+    """
+    os.makedirs(root, exist_ok=True)
+    manifest = {
+        "cell_deg": cell_deg,
+        "tile_deg": tile_deg,
+        "nodata": nodata,
+        "depths": list(depths),
+        "properties": {code: {"unit": unit} for code, unit in properties.items()},
+    }
+    with open(os.path.join(root, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def write_tile(root, code, depth, ti, tj, array):
+    """Stores one extracted (tile_cells x tile_cells) int16 tile, north-up."""
+    directory = os.path.join(root, code, depth)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, f"{ti}_{tj}.npy"), np.asarray(array, dtype=np.int16))
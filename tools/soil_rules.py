@@ -0,0 +1,246 @@
+import numpy as np
+
+# SoilGrids serves integers in "mapped units"; dividing by these factors gives
+# conventional units (pH, g/kg SOC, cmol(c)/kg CEC, % sand/silt/clay).
+SOILGRIDS_CONVERSION_FACTORS = {
+    "Soil pH": 10,
+    "Soil Organic Carbon": 10,
+    "Cation Exchange Capacity": 10,
+    "Sand Content": 10,
+    "Silt Content": 10,
+    "Clay Content": 10,
+    "Organic Carbon Density": 10,
+    "Bulk Density": 100,
+}
+# Root-zone layers averaged (thickness-weighted) into one value per property.
+TOPSOIL_DEPTHS = {"0-5cm": 5, "5-15cm": 10, "15-30cm": 15}
+
+PH_BIN_WIDTH = 0.5
+# Upper edges in g/kg; 5 and 7.5 g/kg are the 0.5% / 0.75% OC cut-offs of Indian soil health cards.
+SOC_BAND_EDGES = [5.0, 7.5, 10.0, 20.0]
+# Upper edges in cmol(c)/kg.
+CEC_BAND_EDGES = [5.0, 10.0, 20.0, 30.0]
+
+USDA_TEXTURE_CLASSES = [
+    "sand",
+    "loamy sand",
+    "sandy loam",
+    "loam",
+    "silt loam",
+    "silt",
+    "sandy clay loam",
+    "clay loam",
+    "silty clay loam",
+    "sandy clay",
+    "silty clay",
+    "clay",
+]
+
+
+def topsoil_values(profiles, labels):
+    """
+    (profiles x labels) float array of thickness-weighted topsoil means in
+    conventional units, NaN where a property has no data in the top 30 cm.
+    """
+    weights = np.array(list(TOPSOIL_DEPTHS.values()), dtype=np.float64)
+    values = np.full((len(profiles), len(labels), len(TOPSOIL_DEPTHS)), np.nan)
+    for i, soil_data in enumerate(profiles):
+        for j, label in enumerate(labels):
+            depth_data = soil_data.get(label, {})
+            for k, depth in enumerate(TOPSOIL_DEPTHS):
+                value = depth_data.get(depth, {}).get("value", "Missing")
+                if value != "Missing" and value is not None:
+                    values[i, j, k] = float(value) / SOILGRIDS_CONVERSION_FACTORS.get(label, 1)
+
+    present = ~np.isnan(values)
+    total_weight = (present * weights).sum(axis=2)
+    weighted = np.where(present, values, 0.0) @ weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total_weight > 0, weighted / total_weight, np.nan)
+
+
+def usda_texture_class(sand, silt, clay):
+    """
+    Index into `USDA_TEXTURE_CLASSES` for each (sand, silt, clay) percentage triple,
+    following the USDA texture triangle; -1 where any fraction is missing.
+    """
+    sand = np.asarray(sand, dtype=np.float64)
+    silt = np.asarray(silt, dtype=np.float64)
+    clay = np.asarray(clay, dtype=np.float64)
+    total = sand + silt + clay
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sand, silt, clay = (100 * sand / total, 100 * silt / total, 100 * clay / total)
+
+    conditions = [
+        silt + 1.5 * clay < 15,
+        silt + 2 * clay < 30,
+        ((clay >= 7) & (clay < 20) & (sand > 52)) | ((clay < 7) & (silt < 50)),
+        (clay >= 7) & (clay < 27) & (silt >= 28) & (silt < 50) & (sand <= 52),
+        (silt >= 50) & (clay < 27) & ~((silt >= 80) & (clay < 12)),
+        (silt >= 80) & (clay < 12),
+        (clay >= 20) & (clay < 35) & (silt < 28) & (sand > 45),
+        (clay >= 27) & (clay < 40) & (sand > 20) & (sand <= 45),
+        (clay >= 27) & (clay < 40) & (sand <= 20),
+        (clay >= 35) & (sand > 45),
+        (clay >= 40) & (silt >= 40),
+        clay >= 40,
+    ]
+    classes = np.select(conditions, np.arange(len(USDA_TEXTURE_CLASSES)), default=-1)
+    return np.where(np.isfinite(total) & (total > 0), classes, -1)
+
+
+def band_indices(values, edges):
+    """Band index of each value against ascending upper `edges`; -1 for NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), -1, np.searchsorted(edges, values, side="right"))
+
+
+# Coarse, moderately coarse, medium and fine texture groups for each USDA class.
+TEXTURE_GROUPS = np.array([0, 0, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3])
+PH_BAND_EDGES = [5.5, 6.5, 7.5, 8.5]
+# Bulk density (g/cm3) above which root growth is restricted in most textures.
+COMPACTION_BULK_DENSITY = 1.6
+
+TEXTURE_IMPLICATIONS = [
+    "drains very quickly and holds little water or nutrients. It is easy to work and warms up early, but crops need frequent light irrigation and split fertilizer doses.",
+    "drains well and is easy to till. Water and nutrient holding is moderate, so mulching and organic matter help crops through dry spells.",
+    "has a good balance of drainage, aeration and water holding, and suits most crops.",
+    "holds water and nutrients well but drains slowly. It can waterlog after heavy rain, crack when dry, and becomes hard to till if worked wet.",
+]
+PH_IMPLICATIONS = [
+    "Strongly acidic (pH {ph:.1f}): phosphorus, calcium and magnesium become less available and aluminium can harm roots. Liming is usually needed except for acid-tolerant crops such as tea, potato or pineapple.",
+    "Moderately acidic (pH {ph:.1f}): most crops grow well, though phosphorus availability is slightly reduced and legumes may benefit from light liming.",
+    "Near neutral (pH {ph:.1f}): nutrients are most available in this range and soil microbes are active, which suits nearly all crops.",
+    "Moderately alkaline (pH {ph:.1f}): zinc, iron, manganese and phosphorus can get locked up, so watch for yellowing of young leaves and apply micronutrients where needed.",
+    "Strongly alkaline (pH {ph:.1f}): the soil is at risk of sodicity, poor structure and micronutrient deficiencies. Gypsum and organic matter help reclaim it.",
+]
+ORGANIC_CARBON_ANALYSIS = [
+    "Organic carbon is low ({soc:.1f} g/kg, below 0.5%). Regular compost, farmyard manure, green manure and crop residue retention will improve fertility and water holding.",
+    "Organic carbon is medium ({soc:.1f} g/kg). Keep adding organic matter to build it up and sustain soil life.",
+    "Organic carbon is good ({soc:.1f} g/kg), supporting nutrient supply, structure and water holding. Residue retention and reduced tillage will maintain it.",
+    "Organic carbon is good ({soc:.1f} g/kg), supporting nutrient supply, structure and water holding. Residue retention and reduced tillage will maintain it.",
+    "Organic carbon is very high ({soc:.1f} g/kg). The soil is rich in organic matter; make sure it drains well, as such soils can stay wet.",
+]
+GROUP_CROPS = [
+    "Groundnut, pearl millet (bajra), cluster bean, watermelon, carrot and other root crops under drip or sprinkler irrigation.",
+    "Groundnut, maize, cotton, pulses such as green gram and black gram, and most vegetables.",
+    "Wheat, maize, sugarcane, pulses, oilseeds and vegetables; the widest choice of crops.",
+    "Paddy, wheat, cotton, chickpea (gram), sugarcane and other crops that can use stored soil moisture.",
+]
+GROUP_IMPROVEMENTS = [
+    "Add compost or farmyard manure every season, mulch the surface, and use drip irrigation with split nitrogen doses.",
+    "Build organic matter with green manure and mulching, and keep the surface covered between crops.",
+    "Rotate cereals with legumes and retain crop residues to keep the soil in good condition.",
+    "Use raised beds or field drains, avoid tilling when wet, and add organic matter to loosen the soil.",
+]
+PH_IMPROVEMENTS = {
+    0: "Apply agricultural lime as per a soil test.",
+    3: "Apply zinc sulphate and prefer acid-forming fertilizers such as ammonium sulphate.",
+    4: "Apply gypsum as per a soil test and improve drainage.",
+}
+
+
+def classify_profiles(profiles):
+    """
+    Vectorized soil classification for many `extract_soil_properties` profiles.
+    Returns a dict of per-profile arrays: topsoil means in conventional units and
+    the texture class, texture group, pH, SOC and CEC band indices (-1 if unknown).
+    """
+    labels = ["Soil pH", "Sand Content", "Silt Content", "Clay Content",
+              "Soil Organic Carbon", "Cation Exchange Capacity", "Bulk Density"]
+    ph, sand, silt, clay, soc, cec, bulk_density = topsoil_values(profiles, labels).reshape(-1, len(labels)).T
+    texture = usda_texture_class(sand, silt, clay)
+    return {
+        "ph": ph,
+        "soc": soc,
+        "cec": cec,
+        "bulk_density": bulk_density,
+        "texture_class": texture,
+        "texture_group": np.where(texture >= 0, TEXTURE_GROUPS[texture], -1),
+        "ph_band": band_indices(ph, PH_BAND_EDGES),
+        "soc_band": band_indices(soc, SOC_BAND_EDGES),
+        "cec_band": band_indices(cec, CEC_BAND_EDGES),
+    }
+
+
+def _join(findings, empty):
+    if not findings:
+        return empty
+    findings[0] = findings[0][0].upper() + findings[0][1:]
+    return "; ".join(findings) + "."
+
+
+def rule_insights(profiles):
+    """
+    Deterministic soil insights for many profiles, one dict per profile with the
+    `RichSoilInsightOutput` fields plus `soil_texture`. Crop and improvement advice
+    are generic per texture group and pH band; callers may replace them with LLM advice.
+    """
+    c = classify_profiles(profiles)
+    results = []
+    for i in range(len(profiles)):
+        texture, group = int(c["texture_class"][i]), int(c["texture_group"][i])
+        ph_band, soc_band, cec_band = int(c["ph_band"][i]), int(c["soc_band"][i]), int(c["cec_band"][i])
+        compacted = c["bulk_density"][i] > COMPACTION_BULK_DENSITY
+
+        strengths, weaknesses = [], []
+        if ph_band in (1, 2):
+            strengths.append("a pH that suits most crops")
+        elif ph_band == 0:
+            weaknesses.append("strong acidity")
+        elif ph_band == 3:
+            weaknesses.append("mild alkalinity that can limit micronutrients")
+        elif ph_band == 4:
+            weaknesses.append("strong alkalinity with a risk of sodicity")
+        if soc_band >= 2:
+            strengths.append("good organic carbon")
+        elif soc_band == 0:
+            weaknesses.append("low organic carbon")
+        if cec_band >= 3:
+            strengths.append("high nutrient-holding capacity")
+        elif cec_band in (0, 1):
+            weaknesses.append("low nutrient-holding capacity, so nutrients leach easily")
+        if group == 0:
+            weaknesses.append("very low water holding")
+        elif group == 1:
+            strengths.append("good drainage and easy tillage")
+        elif group == 2:
+            strengths.append("a balanced loamy texture")
+        elif group == 3:
+            strengths.append("high water and nutrient retention")
+            weaknesses.append("slow drainage and a risk of waterlogging")
+        if compacted:
+            weaknesses.append("high bulk density, which points to compaction")
+
+        improvements = [GROUP_IMPROVEMENTS[group]] if group >= 0 else []
+        if ph_band in PH_IMPROVEMENTS:
+            improvements.append(PH_IMPROVEMENTS[ph_band])
+        if compacted:
+            improvements.append("Break compacted layers with deep ploughing or a subsoiler once every few years.")
+
+        texture_name = USDA_TEXTURE_CLASSES[texture] if texture >= 0 else None
+        results.append({
+            "soil_texture": texture_name,
+            "soil_strengths": _join(strengths, "No clear strengths stand out in the available data."),
+            "soil_weaknesses": _join(weaknesses, "No major limitations are visible in the available data."),
+            "texture_implications": (
+                f"This is a {texture_name} soil, which {TEXTURE_IMPLICATIONS[group]}" if texture >= 0
+                else "Texture data is not available for this location."
+            ),
+            "ph_implications": (
+                PH_IMPLICATIONS[ph_band].format(ph=c["ph"][i]) if ph_band >= 0
+                else "pH data is not available for this location."
+            ),
+            "organic_carbon_analysis": (
+                ORGANIC_CARBON_ANALYSIS[soc_band].format(soc=c["soc"][i]) if soc_band >= 0
+                else "Organic carbon data is not available for this location."
+            ),
+            "recommended_crop_types": (
+                GROUP_CROPS[group] if group >= 0 else "Crop suitability cannot be judged without texture data."
+            ),
+            "soil_health_improvements": (
+                " ".join(improvements) if improvements
+                else "Add organic matter regularly and get a soil test to guide fertilizer use."
+            ),
+        })
+    return results
@@ -0,0 +1,57 @@
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+# MiniLM truncates at 256 word pieces; ~180 words keeps a passage inside that window.
+SCHEME_CHUNK_WORDS = int(os.getenv("SCHEME_CHUNK_WORDS", "180"))
+SCHEME_CHUNK_OVERLAP_WORDS = int(os.getenv("SCHEME_CHUNK_OVERLAP_WORDS", "40"))
+if not 0 <= SCHEME_CHUNK_OVERLAP_WORDS < SCHEME_CHUNK_WORDS:
+    raise ValueError(
+        f"SCHEME_CHUNK_OVERLAP_WORDS ({SCHEME_CHUNK_OVERLAP_WORDS}) must be >= 0 and below "
+        f"SCHEME_CHUNK_WORDS ({SCHEME_CHUNK_WORDS})"
+    )
+
+
+def chunk_text(text, max_words=SCHEME_CHUNK_WORDS, overlap_words=SCHEME_CHUNK_OVERLAP_WORDS):
+    """
+    Splits `text` into passages of at most `max_words` words. Paragraphs are kept
+    whole where they fit; each passage repeats the last `overlap_words` words of
+    the previous one so that sentences on a boundary stay retrievable.
+    """
+    if not 0 <= overlap_words < max_words:
+        raise ValueError(f"overlap_words ({overlap_words}) must be >= 0 and below max_words ({max_words})")
+    words = []
+    boundaries = []
+    for paragraph in re.split(r"\n+", text):
+        paragraph_words = paragraph.split()
+        if paragraph_words:
+            words.extend(paragraph_words)
+            boundaries.append(len(words))
+    if not words:
+        return []
+
+    passages = []
+    start = 0
+    while True:
+        end = min(start + max_words, len(words))
+        if end < len(words):
+            # Prefer to end on a paragraph boundary if one falls in the back half.
+            paragraph_ends = [b for b in boundaries if start + max_words // 2 <= b < end]
+            if paragraph_ends:
+                end = paragraph_ends[-1]
+        passages.append(" ".join(words[start:end]))
+        if end >= len(words):
+            return passages
+        start = max(end - overlap_words, start + 1)
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
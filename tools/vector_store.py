@@ -0,0 +1,366 @@
+import os
+import json
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dotenv import load_dotenv
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+from google.cloud.firestore_v1.vector import Vector
+from tools.local_cache import SqliteCache, file_lock
+from tools.array_ops import top_k_indices
+from tools.scheme_store import SCHEME_COLLECTION, commit_in_batches
+
+load_dotenv()
+# "firestore" (Firestore find_nearest) or "local" (in-process index under VECTOR_STORE_DIR)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "firestore")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join("data", "scheme_vectors"))
+# Below this many vectors the local store scans exhaustively instead of using the IVF index.
+VECTOR_STORE_IVF_MIN_ROWS = int(os.getenv("VECTOR_STORE_IVF_MIN_ROWS", "2048"))
+VECTOR_STORE_NPROBE = int(os.getenv("VECTOR_STORE_NPROBE", "16"))
+
+
+class VectorStore(ABC):
+    """
+    Interface of the scheme vector stores. Items are `(doc_id, embedding, metadata)`;
+    an embedding of None updates metadata only, and `farmer_ids` in metadata is
+    merged into the stored list rather than replacing it.
+    """
+
+    @abstractmethod
+    def get_metadata(self, ids):
+        """`{doc_id: metadata}` for the stored subset of `ids`."""
+
+    @abstractmethod
+    def upsert(self, items):
+        pass
+
+    @abstractmethod
+    def delete(self, ids):
+        """Removes `ids`; ids that are not stored are ignored."""
+
+    @abstractmethod
+    def search(self, query_vector, k=5, state=None, farmer_id=None):
+        """
+        Metadata dicts of the `k` nearest documents by dot product, optionally
+        filtered, each with its dot product as `score`.
+        """
+
+
+class FirestoreVectorStore(VectorStore):
+    def __init__(self, client, collection=SCHEME_COLLECTION):
+        self.client = client
+        self.collection = client.collection(collection)
+
+    def get_metadata(self, ids):
+        refs = [self.collection.document(doc_id) for doc_id in ids]
+        if not refs:
+            return {}
+        return {
+            snapshot.id: snapshot.to_dict()
+            for snapshot in self.client.get_all(refs, field_paths=["content_hash", "farmer_ids", "passage_count", "state"])
+            if snapshot.exists
+        }
+
+    def upsert(self, items):
+        operations = []
+        for doc_id, embedding, metadata in items:
+            data = dict(metadata)
+            if "farmer_ids" in data:
+                data["farmer_ids"] = firestore.ArrayUnion(list(data["farmer_ids"]))
+            if embedding is not None:
+                data["embedding"] = Vector(np.asarray(embedding, dtype=np.float64).tolist())
+            operations.append(("set", self.collection.document(doc_id), data, True))
+        commit_in_batches(self.client, operations)
+
+    def delete(self, ids):
+        commit_in_batches(self.client, [("delete", self.collection.document(doc_id)) for doc_id in ids])
+
+    def search(self, query_vector, k=5, state=None, farmer_id=None):
+        query = self.collection
+        if state:
+            query = query.where(filter=FieldFilter("state", "==", state))
+        if farmer_id:
+            query = query.where(filter=FieldFilter("farmer_ids", "array_contains", farmer_id))
+        docs = query.find_nearest(
+            vector_field="embedding",
+            query_vector=Vector(np.asarray(query_vector, dtype=np.float64).tolist()),
+            distance_measure=DistanceMeasure.DOT_PRODUCT,
+            limit=k,
+            distance_result_field="score"
+        ).stream()
+        results = []
+        for doc in docs:
+            data = doc.to_dict()
+            data.pop("embedding", None)
+            results.append(data)
+        return results
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store persisted under `root`.
+
+    vectors.f32      row-major float32 (rows x dim) unit vectors, memory-mapped and
+                     appended to in place
+    metadata.sqlite  doc_id -> {"row": i, **metadata}
+    index.json       dim, plus the row count the IVF centroids were trained on;
+                     rewritten last by every write
+    centroids.npy    IVF coarse centroids (spherical k-means), once there are
+                     `VECTOR_STORE_IVF_MIN_ROWS` vectors
+
+    Filters use in-memory columns rebuilt from the metadata at load: a live-row
+    mask, state codes per row, and a row posting list per farmer ID. Searches
+    probe the `nprobe` closest IVF inverted lists and filter only those rows,
+    falling back to an exact scan when the index is absent or the filtered
+    candidates are too few; a farmer-filtered search scans that farmer's rows. The index is
+    retrained whenever the store has doubled since the last training. Deleting a
+    document drops its metadata; its row stays in vectors.f32 but is never returned.
+
+    Several processes may share `root` (the corpus job and server workers). Writes
+    hold an exclusive lock on store.lock and number new rows from the file as it
+    is then; every call first reloads the store if index.json or vectors.f32
+    changed since this process last loaded or wrote it.
+    """
+
+    def __init__(self, root=VECTOR_STORE_DIR, nprobe=VECTOR_STORE_NPROBE, ivf_min_rows=VECTOR_STORE_IVF_MIN_ROWS):
+        self.root = root
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        os.makedirs(root, exist_ok=True)
+        self.vectors_path = os.path.join(root, "vectors.f32")
+        self.index_path = os.path.join(root, "index.json")
+        self.centroids_path = os.path.join(root, "centroids.npy")
+        self.lock_path = os.path.join(root, "store.lock")
+        self.metadata_store = SqliteCache(os.path.join(root, "metadata.sqlite"), table="documents")
+        self._lock = threading.RLock()
+        with file_lock(self.lock_path, shared=True):
+            self._load()
+
+    def _disk_signature(self):
+        try:
+            index = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        return index.st_ino, index.st_mtime_ns, size
+
+    def _reload_if_changed(self):
+        if self._disk_signature() != self._signature:
+            self._load()
+
+    def _sync(self):
+        """Picks up writes from other processes; the caller holds `_lock`."""
+        if self._disk_signature() != self._signature:
+            with file_lock(self.lock_path, shared=True):
+                self._reload_if_changed()
+
+    def _load(self):
+        self._signature = self._disk_signature()
+        index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+        self.dim = index.get("dim")
+        self.trained_rows = index.get("trained_rows", 0)
+        self._metadata = {}
+        self._row_ids = {}
+        for doc_id, value in self.metadata_store.items():
+            self._metadata[doc_id] = value
+            self._row_ids[value["row"]] = doc_id
+        self._open_vectors()
+        self._live = np.zeros(self.rows, dtype=bool)
+        self._state_codes = np.full(self.rows, -1, dtype=np.int32)
+        self._state_ids = {}
+        self._farmer_rows = defaultdict(set)
+        for metadata in self._metadata.values():
+            self._index_row(metadata)
+        self.centroids = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        self._assignments = None
+        if self.centroids is not None:
+            self._set_assignments(self._assign(0, self.rows))
+
+    def _index_row(self, metadata):
+        row = metadata["row"]
+        if row >= self.rows:
+            return
+        self._live[row] = True
+        state = metadata.get("state")
+        self._state_codes[row] = self._state_ids.setdefault(state, len(self._state_ids)) if state else -1
+        for farmer in metadata.get("farmer_ids") or []:
+            self._farmer_rows[farmer].add(row)
+
+    def _set_assignments(self, assignments):
+        # Inverted lists: rows sorted by centroid, with each centroid's slice bounds.
+        self._assignments = assignments
+        self._list_order = np.argsort(assignments, kind="stable")
+        self._list_bounds = np.searchsorted(assignments[self._list_order], np.arange(len(self.centroids) + 1))
+
+    def _open_vectors(self):
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if self.dim and os.path.exists(self.vectors_path) else 0
+        self.rows = rows
+        self.vectors = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+        )
+
+    def _save_index(self):
+        # Replaced atomically; its new inode/mtime tells other processes to reload.
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"dim": self.dim, "trained_rows": self.trained_rows}, f)
+        os.replace(temp_path, self.index_path)
+        self._signature = self._disk_signature()
+
+    def _assign(self, start, stop, chunk=8192):
+        assignments = np.empty(stop - start, dtype=np.int32)
+        for i in range(start, stop, chunk):
+            block = np.asarray(self.vectors[i:min(i + chunk, stop)])
+            assignments[i - start:i - start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _train(self, iterations=10, sample_size=20000, seed=0):
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(self.rows, size=min(sample_size, self.rows), replace=False))
+        sample = np.asarray(self.vectors[sample_rows])
+        nlist = max(1, int(np.sqrt(self.rows)))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self.centroids = centroids.astype(np.float32)
+        np.save(self.centroids_path, self.centroids)
+        self.trained_rows = self.rows
+        self._save_index()
+        self._set_assignments(self._assign(0, self.rows))
+
+    def get_metadata(self, ids):
+        with self._lock:
+            self._sync()
+            return {doc_id: dict(self._metadata[doc_id]) for doc_id in ids if doc_id in self._metadata}
+
+    def upsert(self, items):
+        if not items:
+            return
+        with self._lock, file_lock(self.lock_path):
+            self._reload_if_changed()
+            appended, updated = [], []
+            for doc_id, embedding, metadata in items:
+                stored = self._metadata.get(doc_id)
+                merged = {**(stored or {}), **metadata}
+                if "farmer_ids" in metadata:
+                    merged["farmer_ids"] = list(dict.fromkeys((stored or {}).get("farmer_ids", []) + list(metadata["farmer_ids"])))
+                merged.pop("embedding", None)
+                if embedding is not None:
+                    vector = np.asarray(embedding, dtype=np.float32)
+                    vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+                    if self.dim is None:
+                        self.dim = len(vector)
+                        self._save_index()
+                    if doc_id in self._metadata:
+                        updated.append((self._metadata[doc_id]["row"], vector))
+                        merged["row"] = self._metadata[doc_id]["row"]
+                    else:
+                        merged["row"] = self.rows + len(appended)
+                        appended.append(vector)
+                elif stored is None:
+                    continue
+                self._metadata[doc_id] = merged
+                self._row_ids[merged["row"]] = doc_id
+
+            if appended:
+                with open(self.vectors_path, "a+b") as f:
+                    # Drop a partial row left by a writer that died mid-append.
+                    f.truncate(self.rows * 4 * self.dim)
+                    f.write(np.stack(appended).astype(np.float32).tobytes())
+            if updated:
+                writable = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.rows + len(appended), self.dim))
+                for row, vector in updated:
+                    writable[row] = vector
+                writable.flush()
+                del writable
+
+            start = self.rows
+            self._open_vectors()
+            grown = self.rows - len(self._live)
+            if grown > 0:
+                self._live = np.concatenate([self._live, np.zeros(grown, dtype=bool)])
+                self._state_codes = np.concatenate([self._state_codes, np.full(grown, -1, dtype=np.int32)])
+            for doc_id, _, _ in items:
+                if doc_id in self._metadata:
+                    self.metadata_store.set(doc_id, self._metadata[doc_id])
+                    self._index_row(self._metadata[doc_id])
+
+            if self.rows >= self.ivf_min_rows and (self.centroids is None or self.rows >= 2 * self.trained_rows):
+                self._train()
+            elif self.centroids is not None:
+                assignments = self._assignments
+                stale = [row for row, _ in updated]
+                if stale:
+                    assignments[stale] = np.argmax(self.vectors[stale] @ self.centroids.T, axis=1)
+                if self.rows > start:
+                    assignments = np.concatenate([assignments, self._assign(start, self.rows)])
+                if stale or self.rows > start:
+                    self._set_assignments(assignments)
+            self._save_index()
+
+    def delete(self, ids):
+        with self._lock, file_lock(self.lock_path):
+            self._reload_if_changed()
+            removed = False
+            for doc_id in ids:
+                metadata = self._metadata.pop(doc_id, None)
+                if metadata is not None:
+                    removed = True
+                    row = metadata["row"]
+                    self._row_ids.pop(row, None)
+                    if row < self.rows:
+                        self._live[row] = False
+                    for farmer in metadata.get("farmer_ids") or []:
+                        self._farmer_rows[farmer].discard(row)
+                    self.metadata_store.delete(doc_id)
+            if removed:
+                self._save_index()
+
+    def _filter_rows(self, rows, state):
+        keep = self._live[rows]
+        if state:
+            keep &= self._state_codes[rows] == self._state_ids.get(state, -2)
+        return rows[keep]
+
+    def search(self, query_vector, k=5, state=None, farmer_id=None):
+        with self._lock:
+            self._sync()
+            if not self.rows:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+            candidates = None
+            if farmer_id:
+                # A farmer's posting list is small, so it is scanned exactly.
+                farmer_rows = np.fromiter(sorted(self._farmer_rows.get(farmer_id, ())), dtype=np.int64)
+                candidates = self._filter_rows(farmer_rows, state)
+            elif self.centroids is not None:
+                probe = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+                probed = np.concatenate([self._list_order[self._list_bounds[c]:self._list_bounds[c + 1]] for c in probe])
+                probed = self._filter_rows(probed, state)
+                if len(probed) >= k:
+                    candidates = probed
+            if candidates is None:
+                candidates = self._filter_rows(np.arange(self.rows), state)
+            if not len(candidates):
+                return []
+
+            scores = np.asarray(self.vectors[candidates]) @ query
+            results = []
+            for i in top_k_indices(-scores, np.ones(len(candidates), dtype=bool), k):
+                metadata = {key: value for key, value in self._metadata[self._row_ids[int(candidates[i])]].items() if key != "row"}
+                metadata["score"] = float(scores[i])
+                results.append(metadata)
+            return results
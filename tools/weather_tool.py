@@ -1,12 +1,15 @@
 import os
-import requests
+import math
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from typing import Optional
+from tools.http_client import http_get, http_post
+from tools.local_cache import TieredCache, RefreshingCache
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.05"))
 
 class FarmerInfoInput(BaseModel):
     state: str
@@ -18,19 +21,52 @@ class CoordinateInput(BaseModel):
     lat: float = Field(..., description="Latitude of the location")
     lon: float = Field(..., description="Longitude of the location")
 
+class GeocodingError(Exception):
+    """Geocoding API refusal; `status` is the API status (e.g. "ZERO_RESULTS") when known."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+# Geocoding results never expire (villages don't move); definitive misses are cached too.
+GEOCODE_NEGATIVE_STATUSES = {"ZERO_RESULTS", "INVALID_REQUEST"}
+geocode_cache = TieredCache(
+    os.getenv("GEOCODE_CACHE_PATH", os.path.join("data", "geocode_cache.sqlite")),
+    table="geocode",
+    maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", "4096")),
+)
+
+def normalize_place_name(place_name):
+    parts = [" ".join(part.split()).lower() for part in place_name.split(",")]
+    return ", ".join(part for part in parts if part)
+
 def get_location_coordinates(state, district=None, village=None):
     place_components = [village, district, state]
     place_name = ", ".join([p for p in place_components if p])
+
+    cache_key = normalize_place_name(place_name)
+    cached = geocode_cache.get(cache_key)
+    if cached is not None:
+        if "error" in cached:
+            raise GeocodingError("Geocoding failed: " + cached["error"], cached.get("status"))
+        return cached["lat"], cached["lng"], place_name
     
     geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {"address": place_name, "key": GOOGLE_API_KEY}
-    response = requests.get(geocode_url, params=params).json()
+    response = http_get(geocode_url, params=params).json()
 
     if response["status"] == "OK":
         location = response["results"][0]["geometry"]["location"]
+        geocode_cache.set(cache_key, {"lat": location["lat"], "lng": location["lng"]})
         return location["lat"], location["lng"], place_name
     else:
-        raise Exception("Geocoding failed: " + response.get("error_message", "Unknown error"))
+        error = response.get("error_message", "Unknown error")
+        if response["status"] in GEOCODE_NEGATIVE_STATUSES:
+            geocode_cache.set(cache_key, {"error": error, "status": response["status"]})
+        raise GeocodingError("Geocoding failed: " + error, response["status"])
+
+def get_geocode_cache_stats():
+    return geocode_cache.stats()
     
 @tool(args_schema=FarmerInfoInput)
 def get_location_coordinates_tools(state: str, district: Optional[str] = None, village: Optional[str] = None):
@@ -78,7 +114,7 @@ def get_location_coordinates_tools(state: str, district: Optional[str] = None, v
 
 def get_pincode_from_coordinates(lat, lon):
     url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={GOOGLE_API_KEY}"
-    response = requests.get(url)
+    response = http_get(url)
     data = response.json()
 
     if data['status'] == 'OK':
@@ -110,7 +146,42 @@ def get_pincode_from_coordinates_tools(lat, lon):
     data=get_pincode_from_coordinates(lat, lon)
     return data
 
+# Weather is shared per grid cell: every farmer in a cell gets the forecast for its center.
+# TTLs follow the provider's update cadence; stale entries are served while one refresh runs.
+current_weather_cache = RefreshingCache(
+    ttl=float(os.getenv("WEATHER_CURRENT_TTL_SECONDS", "900")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_SECONDS", "1800")),
+    cacheable=lambda value: "message" not in value,
+)
+forecast_cache = RefreshingCache(
+    ttl=float(os.getenv("WEATHER_FORECAST_TTL_SECONDS", "3600")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_SECONDS", "1800")),
+    cacheable=lambda value: isinstance(value, list),
+)
+
+def snap_to_grid(lat, lon, cell_deg=WEATHER_GRID_DEG):
+    def center(value):
+        return round((math.floor(float(value) / cell_deg) + 0.5) * cell_deg, 6)
+    return center(lat), center(lon)
+
 def get_google_weather(lat, lon, units="METRIC"):
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    return current_weather_cache.get_or_load(
+        (cell_lat, cell_lon, units),
+        lambda: fetch_google_weather(cell_lat, cell_lon, units),
+    )
+
+def get_7_day_forecast(lat, lon, units="METRIC"):
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    return forecast_cache.get_or_load(
+        (cell_lat, cell_lon, units),
+        lambda: fetch_7_day_forecast(cell_lat, cell_lon, units),
+    )
+
+def get_weather_cache_stats():
+    return {"current": current_weather_cache.stats(), "forecast": forecast_cache.stats()}
+
+def fetch_google_weather(lat, lon, units="METRIC"):
     url = "https://weather.googleapis.com/v1/currentConditions:lookup"
     params = {
         "key": GOOGLE_API_KEY,
@@ -118,7 +189,7 @@ def get_google_weather(lat, lon, units="METRIC"):
         "location.longitude": lon,
         "unitsSystem": units
     }
-    response = requests.get(url, params=params)
+    response = http_get(url, params=params)
     if response.status_code == 200:
         data = response.json()
         weather = data.get("currentConditions", data)
@@ -137,7 +208,7 @@ def get_google_weather(lat, lon, units="METRIC"):
         print("Weather API Error:", response.status_code, response.text)
         return {"message": "Weather data not available"}
 
-def get_7_day_forecast(lat, lon, units="METRIC"):
+def fetch_7_day_forecast(lat, lon, units="METRIC"):
     url = "https://weather.googleapis.com/v1/forecast:lookup"
     params = {
         "key": GOOGLE_API_KEY,
@@ -147,7 +218,7 @@ def get_7_day_forecast(lat, lon, units="METRIC"):
         "timesteps": "daily",
     }
 
-    response = requests.get(url, params=params)
+    response = http_get(url, params=params)
     if response.status_code == 200:
         data = response.json()
 
@@ -220,7 +291,8 @@ def get_air_quality_google(lat, lon):
         "languageCode": "en"
     }
 
-    res = requests.post(air_quality_url, params=params, json=body)
+    # A read-only lookup, so safe to retry despite being a POST.
+    res = http_post(air_quality_url, params=params, json=body, idempotent=True)
     if res.status_code != 200:
         return {"message": "No AQI data available"}
     